@@ -0,0 +1,121 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from core.config import Config
+from core.metrics import METRICS
+from database.backfill_plan import BackfillPlan
+from backend.services.youtube_service import YouTubeService
+
+class BackfillPlanner:
+    """
+    Pianificatore del BACKFILL YouTube su un range di date: lista tutti i canali in parallelo
+    (ogni canale smette di paginare al primo video più vecchio di `start`), divide i video in
+    shard di Config.BACKFILL_SHARD_DAYS giorni e li salva in un BackfillPlan condiviso,
+    da cui uno o più processi worker prendono uno shard alla volta.
+    """
+    def __init__(self, yt, plan: BackfillPlan, handles: List[str],
+                 start: Optional[datetime] = None, end: Optional[datetime] = None, shard_days: Optional[int] = None):
+        self.yt = yt
+        self.plan = plan
+        self.handles = list(handles)
+        self.start = YouTubeService.naive_utc(start) or datetime.fromisoformat(Config.YOUTUBE_BACKFILL_START)
+        self.end = YouTubeService.naive_utc(end) or datetime.fromisoformat(Config.YOUTUBE_BACKFILL_END)
+        self.shard_days = max(1, shard_days or Config.BACKFILL_SHARD_DAYS)
+        self.plan_id = BackfillPlan.plan_id(self.handles, self.start, self.end, self.shard_days)
+        self._lock = threading.Lock()
+        # handle -> pagine lette, video nel range, data più vecchia raggiunta
+        self.listing: Dict[str, Dict[str, Any]] = {}
+
+    def _on_page(self, handle: str, pages: int, videos: int, oldest: Optional[datetime]):
+        with self._lock:
+            self.listing[handle] = {"pages": pages, "videos": videos, "oldest": oldest}
+        METRICS.set_gauge("backfill_listing_videos", videos, handle=handle)
+        reached = oldest.date().isoformat() if oldest else "n/d"
+        print(f"      📆 {handle}: pagina {pages} | {videos} video nel range | raggiunto {reached}")
+
+    def _list_channel(self, handle: str) -> List[Dict[str, Any]]:
+        videos = self.yt.get_videos(handle, "BACKFILL", start=self.start, end=self.end, on_page=self._on_page)
+        for v in videos:
+            v["handle"] = handle
+        return videos
+
+    def shard_key(self, video: Dict[str, Any]) -> str:
+        """Primo giorno dello shard del video (stringa ISO, ordinabile)."""
+        try:
+            published = YouTubeService.naive_utc(datetime.fromisoformat(video["date"].replace("Z", "+00:00")))
+        except (KeyError, AttributeError, ValueError):
+            published = self.start
+        index = (published - self.start).days // self.shard_days
+        return (self.start + timedelta(days=index * self.shard_days)).date().isoformat()
+
+    def build(self) -> int:
+        """
+        Crea il piano (listing parallelo + sharding) se nessun worker l'ha già fatto.
+        Restituisce il numero di video pianificati in questo processo (0 se il piano esisteva).
+        """
+        if self.plan.exists(self.plan_id):
+            print(f"   ♻️ Piano backfill {self.plan_id} già presente: ripresa dagli shard aperti")
+            return 0
+
+        print(f"   🗓️ Piano backfill {self.start.date()} → {self.end.date()} | {len(self.handles)} canali in parallelo")
+        with ThreadPoolExecutor(max_workers=max(1, len(self.handles))) as pool:
+            listings = list(pool.map(self._list_channel, self.handles))
+
+        shards: Dict[str, List[Dict[str, Any]]] = {}
+        for videos in listings:
+            for v in videos:
+                shards.setdefault(self.shard_key(v), []).append(v)
+        self.plan.add_shards(self.plan_id, shards)
+        total = sum(len(videos) for videos in listings)
+        print(f"   🗓️ {total} video in {len(shards)} shard da {self.shard_days} giorni")
+        return total
+
+    def claim(self) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        return self.plan.claim(self.plan_id)
+
+    def complete(self, shard: str) -> bool:
+        if not self.plan.complete(self.plan_id, shard):
+            # Lease perso: lo shard è di un altro worker, che lo chiuderà lui
+            print(f"   ⚠️ Shard {shard} ripreso da un altro worker: non chiuso da questo processo")
+            return False
+        self.report()
+        if self.plan.finished(self.plan_id):
+            # Range completato: un nuovo BACKFILL sullo stesso range ripianifica da zero
+            print(f"   ✅ Piano backfill {self.plan_id} completato")
+            self.plan.clear(self.plan_id)
+        return True
+
+    def release(self, shard: str):
+        self.plan.release(self.plan_id, shard)
+
+    @contextmanager
+    def heartbeat(self, shard: str):
+        """
+        Rinnova il lease dello shard ogni terzo di Config.BACKFILL_SHARD_LEASE_SECONDS mentre il blocco
+        è in corso: uno shard lungo non viene ripreso da un altro worker (niente feed duplicati).
+        """
+        stop = threading.Event()
+        interval = max(1.0, Config.BACKFILL_SHARD_LEASE_SECONDS / 3)
+
+        def beat():
+            while not stop.wait(interval):
+                if not self.plan.renew(self.plan_id, shard):
+                    print(f"   ⚠️ Lease dello shard {shard} perso (ripreso da un altro worker?)")
+                    return
+
+        thread = threading.Thread(target=beat, name=f"backfill-lease-{shard}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def report(self):
+        """Avanzamento per canale (video negli shard chiusi / video pianificati)."""
+        for handle, counts in sorted(self.plan.progress(self.plan_id).items()):
+            METRICS.set_gauge("backfill_videos_done", counts["done"], handle=handle)
+            METRICS.set_gauge("backfill_videos_total", counts["total"], handle=handle)
+            print(f"      📈 {handle}: {counts['done']}/{counts['total']} video")
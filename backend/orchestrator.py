@@ -1,78 +1,292 @@
 import time
 import sys
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from datetime import datetime, timezone, timedelta
 from core.config import Config
 from database.repository import MarketRepository
 from backend.services.youtube_service import YouTubeService
 from backend.services.apify_service import ApifyService
 from backend.services.ai_service import AIService
 from backend.services.trump_service import TrumpWatchService
+from database.stage_ledger import StageLedger
+from database.backfill_plan import BackfillPlan
+from backend.backfill import BackfillPlanner
+from core.near_duplicate import NearDuplicateIndex
+from core.apify_runner import ApifyRunner
+from backend.pipeline import Stage, StagedPipeline
+from core.metrics import METRICS
+from core.token_budget import TokenLedger, QuotaExceededError
 
-def run_pipeline(mode: str):
-    print(f"🚀 PIPELINE START | Mode: {mode}")
-    
-    # Iniezione dipendenze
-    repo = MarketRepository()
-    yt = YouTubeService()
-    trump_truth = TrumpWatchService()
-    apify = ApifyService()
-    ai = AIService()
+TRUMP_LISTING_KEY = "listing:truth_social"
+TRUMP_WATERMARK = "truth_social"
+
+class VideoStages:
+    """
+    Stadi della pipeline YouTube (fetch -> transcript -> ai -> persist).
+    Ogni metodo elabora un item e lo passa allo stadio successivo; None lo scarta.
+    Le trascrizioni sono scaricate a lotti: un run Apify per lotto di video.
+    """
+    def __init__(self, mode: str, repo: MarketRepository, yt: YouTubeService, apify: ApifyService,
+                 ai: AIService, ledger: StageLedger, run_key: str, near_dups: Optional[NearDuplicateIndex] = None):
+        self.mode = mode
+        self.near_dups = near_dups
+        self.repo = repo
+        self.yt = yt
+        self.apify = apify
+        self.ai = ai
+        self.ledger = ledger
+        self.run_key = run_key
+
+    def fetch(self, handle: str) -> list:
+        """Listing canale (LIVE) + dedup in blocco. Il BACKFILL lista tramite BackfillPlanner."""
+        return self.select_new(handle, self.yt.get_videos(handle, self.mode))
+
+    def select_new(self, label: str, videos: list) -> list:
+        """Solo i video non ancora nel DB né chiusi nel ledger (una verifica in blocco)."""
+        new_urls = set(self.repo.filter_new_urls([v['url'] for v in videos]))
+        print(f"\n🔍 {label} | {len(videos)} video ({len(videos) - len(new_urls)} già presenti)")
+        return [v for v in videos
+                if v['url'] in new_urls and not self.ledger.is_done(self.run_key, v['url'], StageLedger.PERSISTED)]
+
+    def transcribe_batch(self, videos: list) -> list:
+        """
+        Trascrizioni di un lotto di video con un solo run Apify; quelle già pagate
+        vengono riprese dal checkpoint. Restituisce i video con 'content'.
+        """
+        ready = []
+        missing = []
+        for v in videos:
+            transcript = self.ledger.get(self.run_key, v['url'], StageLedger.TRANSCRIBED)
+            if transcript is None:
+                missing.append(v)
+            else:
+                v['content'] = transcript
+                ready.append(v)
 
+        if missing:
+            transcripts, failures = self.apify.get_transcripts([v['url'] for v in missing])
+            for v in missing:
+                transcript = transcripts.get(v['url'])
+                if not transcript:
+                    print(f"      ⚠️ No transcript found: {v['title'][:40]} ({failures.get(v['url'], 'n/d')})")
+                    continue
+                self.ledger.mark(self.run_key, v['url'], StageLedger.TRANSCRIBED, transcript)
+                v['content'] = transcript
+                ready.append(v)
+        return ready
+
+    def analyze(self, v: dict):
+        """
+        Analisi AI (le quote Gemini sono gestite dal token bucket nel servizio).
+        Con budget token esaurito il video resta al checkpoint TRANSCRIBED e viene ripreso al prossimo run.
+        """
+        analysis = self.ledger.get(self.run_key, v['url'], StageLedger.ANALYZED)
+        if analysis is None and self.near_dups is not None:
+            match = self.near_dups.find(v['content'], "youtube")
+            if match and match[1]:
+                original, analysis = match
+                if original != v['url']:
+                    # Ri-caricamento dello stesso contenuto: collegato all'originale nel feed, nessuna chiamata né nuova riga
+                    print(f"      🔗 Near-duplicate di {original}: {v['title'][:40]}")
+                    if self.repo.link_duplicate(v['url'], original):
+                        self.ledger.mark(self.run_key, v['url'], StageLedger.PERSISTED, {"duplicate_of": original})
+                    return None
+                self.ledger.mark(self.run_key, v['url'], StageLedger.ANALYZED, analysis)
+        if analysis is None:
+            try:
+                # Il backfill è lavoro a bassa priorità: cede il budget residuo al LIVE
+                # In streaming ogni asset è normalizzato appena arriva; i ticker mancanti sono creati
+                # in 'assets' con un solo upsert al salvataggio dell'analisi
+                analysis = self.ai.analyze_video(v['content'], v['title'], low_priority=(self.mode == "BACKFILL"),
+                                                 on_asset=self.repo.prepare_insight)
+            except QuotaExceededError as e:
+                print(f"      ⏸️ Rinviato ({e}): {v['title'][:40]}")
+                return None
+            if not analysis:
+                print(f"      ❌ Analisi AI fallita o vuota: {v['title'][:40]}")
+                return None
+            self.ledger.mark(self.run_key, v['url'], StageLedger.ANALYZED, analysis)
+            if self.near_dups is not None:
+                self.near_dups.add(v['url'], v['content'], "youtube", analysis)
+        return (v, analysis)
+
+    def persist(self, job: tuple):
+        """Salvataggio Video + Insights."""
+        v, analysis = job
+        if self.repo.save_analysis_transaction(v, analysis):
+            self.ledger.mark(self.run_key, v['url'], StageLedger.PERSISTED)
+        return None
+
+class WorkerContext:
+    """
+    Client e stato condivisi tra i blocchi della pipeline.
+    Costruito una volta: in modalità DAEMON resta caldo tra un poll e l'altro.
+    """
+    def __init__(self, repo=None, yt=None, trump_truth=None, apify=None, ai=None,
+                 ledger: Optional[StageLedger] = None, near_dups: Optional[NearDuplicateIndex] = None,
+                 plan: Optional[BackfillPlan] = None):
+        # Iniezione dipendenze (sostituibili, es. con i fake della modalità REPLAY)
+        self.repo = repo or MarketRepository()
+        self.yt = yt or YouTubeService()
+        self.trump_truth = trump_truth or TrumpWatchService()
+        self.apify = apify or ApifyService()
+        self.ai = ai or AIService()
+        # Ledger degli stadi: un run interrotto riparte dall'ultimo checkpoint
+        self.ledger = ledger if ledger is not None else StageLedger()
+        # Impronte SimHash dei contenuti già analizzati: i near-duplicate riusano l'analisi salvata
+        # `is None`: un indice vuoto (len 0) passato dal chiamante va usato, non sostituito
+        self.near_dups = near_dups if near_dups is not None else (NearDuplicateIndex() if Config.NEAR_DUP_ENABLED else None)
+        # Piano a shard del BACKFILL YouTube, condiviso tra i processi worker
+        self.plan = plan if plan is not None else BackfillPlan()
+
+    def prefetch_known_urls(self, mode: str):
+        """
+        Indice URL già elaborati: una lettura paginata invece di una query per video/post.
+        In LIVE basta l'ultima settimana; gli URL fuori finestra sono verificati in blocco.
+        """
+        since = None if mode == "BACKFILL" else (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+        self.repo.prefetch_known_urls("VIDEO", since=since)
+        self.repo.prefetch_known_urls("SOCIAL_POST", since=since)
+
+def run_youtube_block(ctx: WorkerContext, mode: str, run_key: str,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[str]:
+    """Restituisce l'id del piano di backfill elaborato (None in LIVE)."""
     # ==============================================================================
     # 1. BLOCCO YOUTUBE (Analisi Tecnica / Macro)
     # ==============================================================================
-    for handle in Config.YOUTUBE_HANDLES:
-        print(f"\n🔍 Channel: {handle}")
-        videos = yt.get_videos(handle, mode)
-        
-        for v in videos:
-            print(f"   Video: {v['title'][:40]}...")
-            
-            # Controllo esistenza nel DB
-            if repo.video_exists(v['url']):
-                print("      ⏭️ Skipped (Exists)")
-                continue
-            
-            # Scarico Trascrizione
-            transcript = apify.get_transcript(v['url'])
-            if not transcript: 
-                print("      ⚠️ No transcript found")
-                continue
-            
-            v['content'] = transcript
-            
-            # Analisi AI
-            analysis = ai.analyze_video(transcript, v['title'])
-            
-            if analysis:
-                # Salvataggio Video + Insights
-                repo.save_analysis_transaction(v, analysis)
-            else:
-                print("      ❌ Analisi AI fallita o vuota.")
-            
-            # Pausa per evitare rate limit aggressivi di Gemini
-            print("      ⏳ Attesa per rispetto quote Gemini (30s)...")
-            time.sleep(30)
+    # Listing di tutti i canali in parallelo, poi i nuovi video in lotti da Config.APIFY_BATCH_SIZE:
+    # un solo avvio dell'Actor trascrizioni per lotto invece di uno per video.
+    # Stadi separati da code limitate: trascrizioni, chiamate Gemini e scritture DB si sovrappongono.
+    # Il throughput è regolato dai token bucket di Gemini/Apify (Config.GEMINI_RPM / APIFY_RPM).
+    stages = VideoStages(mode, ctx.repo, ctx.yt, ctx.apify, ctx.ai, ctx.ledger, run_key, ctx.near_dups)
+    if mode == "BACKFILL":
+        return run_backfill_shards(ctx, stages, start, end)
+
+    with ThreadPoolExecutor(max_workers=Config.FETCH_WORKERS) as pool:
+        videos = [v for listing in pool.map(stages.fetch, Config.YOUTUBE_HANDLES) for v in listing]
+    run_video_batches(stages, videos)
+    return None
 
+def run_backfill_shards(ctx: WorkerContext, stages: VideoStages,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None) -> str:
+    """
+    BACKFILL YouTube a shard: il primo worker pianifica il range (listing parallelo dei canali),
+    poi ogni processo prende uno shard per data alla volta finché non sono finiti.
+    Restituisce l'id del piano.
+    """
+    planner = BackfillPlanner(ctx.yt, ctx.plan, Config.YOUTUBE_HANDLES, start, end)
+    planner.build()
+    while True:
+        claimed = planner.claim()
+        if not claimed:
+            print("   💤 Nessuno shard di backfill da elaborare.")
+            return planner.plan_id
+        shard, videos = claimed
+        deferred_before = METRICS.total("quota_deferred_total")
+        with planner.heartbeat(shard):
+            run_video_batches(stages, stages.select_new(f"Shard {shard}", videos))
+        if METRICS.total("quota_deferred_total") > deferred_before:
+            # Budget token esaurito: lo shard torna in coda e il worker si ferma
+            planner.release(shard)
+            print(f"   ⏸️ Shard {shard} rinviato per budget token")
+            return planner.plan_id
+        planner.complete(shard)
+
+def run_video_batches(stages: VideoStages, videos: list):
+    if not videos:
+        print("   💤 Nessun video nuovo.")
+        return
+
+    batch_size = max(1, Config.APIFY_BATCH_SIZE)
+    batches = [videos[i:i + batch_size] for i in range(0, len(videos), batch_size)]
+    print(f"   📦 {len(videos)} video nuovi in {len(batches)} lotti di trascrizione")
+    pipeline = StagedPipeline([
+        Stage("transcript", stages.transcribe_batch, workers=Config.TRANSCRIPT_WORKERS, fan_out=True),
+        Stage("ai", stages.analyze, workers=Config.AI_WORKERS),
+        Stage("persist", stages.persist, workers=Config.PERSIST_WORKERS),
+    ], queue_size=Config.PIPELINE_QUEUE_SIZE)
+    pipeline.run(batches)
+
+def run_trump_block(ctx: WorkerContext, mode: str, run_key: str, since: Optional[datetime] = None, pending=None,
+                    backfill_start: Optional[datetime] = None) -> bool:
+    """
+    Restituisce True se tutti i post del listing sono chiusi (salvati, già presenti, scartati);
+    False se qualche analisi o salvataggio è fallito o è stato rinviato (da riprovare al prossimo run).
+    """
     # ==============================================================================
     # 2. BLOCCO TRUMP WATCH (Truth Social - Geopolitica/News)
     # ==============================================================================
+    repo, ledger, trump_truth, near_dups = ctx.repo, ctx.ledger, ctx.trump_truth, ctx.near_dups
     print(f"\n🦅 Analyzing Trump Post (Truth Social)...")
     
-    # Se mode="BACKFILL" scarica storico, altrimenti solo nuovi
+    # Se mode="BACKFILL" scarica storico, altrimenti solo nuovi (dal poll precedente se noto)
     is_backfill = (mode == "BACKFILL")
-    post_trump_truth = trump_truth.get_latest_truths(mode=mode)
+    post_trump_truth = ledger.get(run_key, TRUMP_LISTING_KEY, StageLedger.FETCHED) if is_backfill else None
+    if post_trump_truth is not None:
+        print(f"   ♻️ Scrape Truth Social ripreso dal checkpoint ({len(post_trump_truth)} post)")
+    else:
+        # `pending`: run Apify già avviato (in parallelo al blocco YouTube)
+        # Il watermark (ultimo post elaborato) chiude la lettura del dataset in Live
+        post_trump_truth = trump_truth.get_latest_truths(mode=mode, since=since, pending=pending,
+                                                         watermark=ledger.get_watermark(TRUMP_WATERMARK),
+                                                         backfill_start=backfill_start)
+        if post_trump_truth:
+            ledger.mark(run_key, TRUMP_LISTING_KEY, StageLedger.FETCHED, post_trump_truth)
+    listing = list(post_trump_truth or [])
+
+    # Post chiusi: già nel DB, salvati/scartati in questo run o filtrati di proposito (junk, pre-classificatore)
+    closed = set()
+
+    # Dedup in blocco PRIMA di pagare la chiamata Gemini
+    if post_trump_truth:
+        new_urls = set(repo.filter_new_urls([p.get('url') for p in post_trump_truth]))
+        closed.update(p.get('url') for p in post_trump_truth if p.get('url') not in new_urls)
+        skipped = len(post_trump_truth) - len(new_urls)
+        post_trump_truth = [p for p in post_trump_truth if p.get('url') in new_urls]
+        if skipped:
+            print(f"   ⏭️ {skipped} post già presenti nel DB.")
 
     if not post_trump_truth:
         print("   💤 Nessun post da analizzare.")
     else:
         print(f"   ⚡ Trovati {len(post_trump_truth)} post. Avvio analisi AI...")
     
-    for post_trump in post_trump_truth:
-        # A. Analisi AI (Impact Score & Asset Detection)
-        analysis = trump_truth.analyze_market_impact(post_trump)
-        
+    closed.update(p['url'] for p in post_trump_truth if ledger.is_done(run_key, p['url'], StageLedger.PERSISTED))
+    post_trump_truth = [p for p in post_trump_truth if p['url'] not in closed]
+
+    # A. Analisi AI in blocco (Impact Score & Asset Detection): un prompt ogni Config.TRUMP_BATCH_SIZE post
+    analyses = {p['url']: ledger.get(run_key, p['url'], StageLedger.ANALYZED) for p in post_trump_truth}
+    cleaned = trump_truth.clean_html_batch([p.get('content') or p.get('text') or '' for p in post_trump_truth])
+    texts = {p['url']: text for p, text in zip(post_trump_truth, cleaned)}
+
+    # Repost quasi identici di post già analizzati: analisi riutilizzata, collegati all'originale
+    duplicate_of = {}
+    if near_dups is not None:
+        for p in post_trump_truth:
+            if analyses[p['url']] is not None:
+                continue
+            match = near_dups.find(texts[p['url']], "truth")
+            if match and match[1]:
+                analyses[p['url']] = match[1]
+                if match[0] != p['url']:
+                    duplicate_of[p['url']] = match[0]
+
+    def persist(post_trump: dict, analysis: Optional[dict]):
+        key = post_trump['url']
         if not analysis:
-            continue
+            return
+
+        if key in duplicate_of:
+            # Nessuna nuova riga nel feed: il repost è collegato alla riga dell'originale (raw_metadata.duplicates)
+            print(f"   🔗 Near-duplicate di {duplicate_of[key]}")
+            if not repo.link_duplicate(key, duplicate_of[key]):
+                return
+            ledger.mark(run_key, key, StageLedger.PERSISTED, {"duplicate_of": duplicate_of[key]})
+            closed.add(key)
+            return
 
         # B. Alerting Console
         score = analysis.get('impact_score', 0)
@@ -81,7 +295,10 @@ def run_pipeline(mode: str):
         
         # C. Salvataggio DB
         # Salviamo se lo score è rilevante (>=3) oppure se siamo in BACKFILL
-        if score >= 3 or is_backfill:
+        if score < 3 and not is_backfill:
+            # Non salvato, ma già pagato: il prossimo poll non lo rianalizza
+            repo.mark_known(key)
+        else:
             
             if score >= 4:
                 print(f"   🚨 HIGH IMPACT ALERT: {analysis.get('assets_affected', [])}")
@@ -96,7 +313,207 @@ def run_pipeline(mode: str):
             }
             
             # CHIAMATA AL NUOVO METODO SPECIFICO
-            repo.save_trump_signal(signal_data)
-            
-        # Piccola pausa per cortesia verso le API
-        time.sleep(5)
\ No newline at end of file
+            if not repo.save_trump_signal(signal_data):
+                return
+
+        # Post chiuso (salvato o scartato per score basso)
+        ledger.mark(run_key, key, StageLedger.PERSISTED)
+        closed.add(key)
+
+    # Post con analisi già nota (checkpoint, near-duplicate): salvati subito
+    to_analyze = []
+    for post_trump in post_trump_truth:
+        if analyses[post_trump['url']] is None:
+            to_analyze.append(post_trump)
+        else:
+            persist(post_trump, analyses[post_trump['url']])
+
+    # Analisi in parallelo (blocchi su Config.TRUMP_WORKERS thread, rate limit Gemini condiviso):
+    # ogni risultato è salvato appena il suo blocco termina, in ordine di completamento
+    if to_analyze:
+        filtered = set()
+        results = trump_truth.iter_market_impact(to_analyze, low_priority=is_backfill,
+                                                 texts=[texts[p['url']] for p in to_analyze], skipped=filtered)
+        for idx, analysis in results:
+            post_trump = to_analyze[idx]
+            if idx in filtered:
+                closed.add(post_trump['url'])
+            if analysis:
+                ledger.mark(run_key, post_trump['url'], StageLedger.ANALYZED, analysis)
+                if near_dups is not None:
+                    near_dups.add(post_trump['url'], texts[post_trump['url']], "truth", analysis)
+            persist(post_trump, analysis)
+
+    # Watermark avanzato fin dove i post sono chiusi senza buchi: un'analisi fallita o rinviata
+    # resta oltre il watermark e viene riletta (e riprovata) al prossimo run
+    advance_trump_watermark(ledger, listing, closed)
+    return all(p.get('url') in closed for p in listing)
+
+def advance_trump_watermark(ledger: StageLedger, posts: list, closed: set):
+    """
+    Registra come watermark il post più recente tra `posts` preceduto solo da post chiusi
+    (URL in `closed`), se più nuovo di quello salvato.
+    """
+    dated = [(TrumpWatchService.parse_date(p.get('created_at')), p) for p in posts]
+    newest = None
+    for post_date, post in sorted(((d, p) for d, p in dated if d), key=lambda dp: dp[0]):
+        if post.get('url') not in closed:
+            break
+        newest_date, newest = post_date, post
+    if newest is None:
+        return
+    current = ledger.get_watermark(TRUMP_WATERMARK)
+    current_date = TrumpWatchService.parse_date(current.get('created_at')) if current else None
+    if current_date and current_date >= newest_date:
+        return
+    ledger.set_watermark(TRUMP_WATERMARK, {
+        "id": str(newest.get('id') or newest.get('url')),
+        "created_at": newest_date.isoformat(),
+    })
+    print(f"   🔖 Watermark Truth Social: {newest_date.isoformat()}")
+
+def run_pipeline(mode: str, ctx: Optional[WorkerContext] = None, backfill_start: Optional[datetime] = None,
+                 backfill_end: Optional[datetime] = None):
+    """
+    Run singolo (BACKFILL o LIVE). `backfill_start`/`backfill_end` sovrascrivono il range di default
+    (Config.TRUMP_BACKFILL_START, Config.YOUTUBE_BACKFILL_START/END).
+    """
+    print(f"🚀 PIPELINE START | Mode: {mode}")
+    ctx = ctx or WorkerContext()
+    run_key = mode
+
+    resumed = ctx.ledger.summary(run_key)
+    if resumed:
+        print(f"♻️ Ripresa run {run_key} dal checkpoint: {resumed}")
+
+    deferred_before = METRICS.total("quota_deferred_total")
+    # Scrape Truth Social avviato subito (non bloccante): gira su Apify durante il blocco YouTube
+    trump_run = None
+    if not (mode == "BACKFILL" and ctx.ledger.is_done(run_key, TRUMP_LISTING_KEY, StageLedger.FETCHED)):
+        trump_run = ctx.trump_truth.start_latest_truths(mode=mode, backfill_start=backfill_start)
+
+    ctx.prefetch_known_urls(mode)
+    plan_id = run_youtube_block(ctx, mode, run_key, start=backfill_start, end=backfill_end)
+    run_trump_block(ctx, mode, run_key, pending=trump_run, backfill_start=backfill_start)
+
+    if METRICS.total("quota_deferred_total") > deferred_before:
+        # Item rinviati per budget token: il checkpoint resta, il prossimo run riprende da lì
+        print(f"⏸️ Budget token esaurito: checkpoint {run_key} conservato per il prossimo run")
+    elif plan_id and ctx.plan.open_shards(plan_id):
+        # Shard ancora in lavorazione da altri processi BACKFILL_WORKER (stesso ledger): i loro
+        # checkpoint TRANSCRIBED/ANALYZED restano; il ledger si chiude al primo run a piano finito
+        print(f"⏳ Shard di backfill ancora aperti: checkpoint {run_key} conservato")
+    else:
+        # Run completato: il prossimo riparte da zero
+        ctx.ledger.clear(run_key)
+    TokenLedger().print_report()
+    ctx.repo.print_asset_report()
+    METRICS.write_snapshot()
+    print(f"\n✅ PIPELINE END | Mode: {mode}")
+
+def run_backfill_worker(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Processo aggiuntivo per il BACKFILL YouTube: prende shard dal piano condiviso
+    (o lo crea, se è il primo) accanto al run BACKFILL principale. Niente Truth Social.
+    """
+    print("🧵 BACKFILL WORKER START")
+    ctx = WorkerContext()
+    ctx.prefetch_known_urls("BACKFILL")
+    run_youtube_block(ctx, "BACKFILL", "BACKFILL", start=start, end=end)
+    METRICS.write_snapshot()
+    print("✅ BACKFILL WORKER END")
+
+def run_train_classifier():
+    """
+    Addestra il pre-classificatore Truth sullo storico impact_score salvato nel DB
+    (i BACKFILL salvano anche i post a basso impatto: servono entrambe le classi).
+    """
+    from core.post_classifier import train_and_report
+
+    print("🔮 TRAIN PRE-CLASSIFIER | Lettura storico Truth Social...")
+    repo = MarketRepository()
+    trump_truth = TrumpWatchService()
+    raw_history = repo.get_trump_score_history()
+    history = list(zip(trump_truth.clean_html_batch([content for content, _ in raw_history]),
+                       [score for _, score in raw_history]))
+    print(f"   📚 {len(history)} post con impact_score")
+    train_and_report(history)
+
+def run_bench_html():
+    """
+    Confronta il pulitore HTML veloce con BeautifulSoup sui post Truth salvati nel DB:
+    stesso output atteso (0 differenze) e velocità almeno 10x.
+    """
+    from core.html_text import benchmark
+
+    print("🧪 BENCH HTML | Lettura post Truth Social...")
+    samples = [content for content, _ in MarketRepository().get_trump_score_history()]
+    if not samples:
+        print("⚠️ Nessun post Truth nel DB")
+        return
+    report = benchmark(samples)
+    print(f"🧪 {report}")
+    if report["mismatches"]:
+        print(f"⚠️ Output diverso da BeautifulSoup (primo: post #{report['first_mismatch']})")
+    print(f"{'✅' if report['speedup'] >= 10 else '⚠️'} Speedup {report['speedup']}x (obiettivo 10x)")
+
+def run_daemon():
+    """
+    Modalità DAEMON: client caldi e poll incrementali con calendario per sorgente.
+    Trump ogni Config.TRUMP_POLL_SECONDS, YouTube ogni Config.YOUTUBE_POLL_SECONDS.
+    """
+    print(f"🛰️ DAEMON START | Trump ogni {Config.TRUMP_POLL_SECONDS}s | YouTube ogni {Config.YOUTUBE_POLL_SECONDS}s")
+    ctx = WorkerContext()
+    ctx.prefetch_known_urls("LIVE")
+    if Config.METRICS_PORT:
+        METRICS.serve(Config.METRICS_PORT)
+
+    stop = threading.Event()
+
+    def request_stop(*_):
+        stop.set()
+        # I run Apify in corso vengono interrotti: chi li attende riceve subito lo stato ABORTED
+        ApifyRunner.cancel_all_runners()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, request_stop)
+
+    # Prossima esecuzione e inizio dell'ultimo poll riuscito per sorgente
+    next_run = {"youtube": 0.0, "trump": 0.0}
+    last_trump_poll: Optional[datetime] = None
+
+    while not stop.is_set():
+        now = time.monotonic()
+
+        if now >= next_run["trump"]:
+            poll_started = datetime.now(timezone.utc)
+            # Delta dal poll precedente, con un piccolo margine per i post pubblicati a cavallo
+            # (mai oltre le 24h del LIVE standard, anche dopo una serie di poll con errori)
+            since = None
+            if last_trump_poll:
+                since = max(last_trump_poll - timedelta(seconds=Config.DAEMON_POLL_OVERLAP_SECONDS),
+                            poll_started - timedelta(days=1))
+            try:
+                # Finestra avanzata solo se tutti i post sono stati chiusi: quelli con analisi o
+                # salvataggio falliti restano nella finestra del prossimo poll e vengono riprovati
+                if run_trump_block(ctx, "LIVE", "DAEMON_TRUMP", since=since):
+                    ctx.ledger.clear("DAEMON_TRUMP")
+                    last_trump_poll = poll_started
+                else:
+                    print("   ↩️ Post Truth non chiusi: finestra del poll mantenuta per il prossimo tentativo")
+            except Exception as e:
+                print(f"❌ Errore poll Trump: {e}")
+            next_run["trump"] = now + Config.TRUMP_POLL_SECONDS
+
+        if now >= next_run["youtube"]:
+            try:
+                run_youtube_block(ctx, "LIVE", "DAEMON_YOUTUBE")
+                ctx.ledger.clear("DAEMON_YOUTUBE")
+            except Exception as e:
+                print(f"❌ Errore poll YouTube: {e}")
+            next_run["youtube"] = now + Config.YOUTUBE_POLL_SECONDS
+
+        METRICS.write_snapshot()
+        stop.wait(max(1.0, min(next_run.values()) - time.monotonic()))
+
+    print("🛑 DAEMON STOP")
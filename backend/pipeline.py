@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_STOP = object()
+
+class Stage:
+    """
+    Uno stadio della pipeline: `fn(item)` elabora un item e restituisce l'item per lo stadio
+    successivo (None = scartato). Con `fan_out=True` restituisce una lista di item.
+    """
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1, fan_out: bool = False):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.fan_out = fan_out
+
+        # Statistiche (aggiornate dai worker sotto lock)
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+
+class StagedPipeline:
+    """
+    Pipeline producer/consumer: ogni stadio ha i suoi worker ed è collegato al successivo
+    da una coda limitata (backpressure). Trascrizioni, chiamate AI e scritture DB si sovrappongono
+    e lo stadio collo di bottiglia è visibile da profondità coda e throughput.
+    """
+    def __init__(self, stages: List[Stage], queue_size: int = 8, report_every: float = 30.0):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+        self.report_every = report_every
+        self._started = 0.0
+        self._done = threading.Event()
+
+    def _worker(self, idx: int):
+        stage = self.stages[idx]
+        in_q = self.queues[idx]
+        out_q: Optional[queue.Queue] = self.queues[idx + 1] if idx + 1 < len(self.stages) else None
+
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+
+            t0 = time.perf_counter()
+            try:
+                result = stage.fn(item)
+                error = False
+            except Exception as e:
+                print(f"      ❌ [{stage.name}] Errore: {e}")
+                result, error = None, True
+            elapsed = time.perf_counter() - t0
+
+            outputs = (result or []) if stage.fan_out else ([] if result is None else [result])
+            with stage.lock:
+                stage.processed += 1
+                stage.busy_seconds += elapsed
+                stage.errors += int(error)
+                stage.dropped += int(not outputs and not error)
+                stage.emitted += len(outputs)
+
+            if out_q is not None:
+                for out in outputs:
+                    out_q.put(out)
+                    nxt = self.stages[idx + 1]
+                    with nxt.lock:
+                        nxt.max_depth = max(nxt.max_depth, out_q.qsize())
+
+    def _reporter(self):
+        while not self._done.wait(self.report_every):
+            self.report(final=False)
+
+    def report(self, final: bool = True) -> Dict[str, Dict[str, Any]]:
+        """Stampa e restituisce profondità coda e throughput per stadio."""
+        wall = max(time.perf_counter() - self._started, 1e-9)
+        stats = {}
+        label = "FINALE" if final else "LIVE"
+        print(f"   📊 Pipeline [{label}] dopo {wall:.1f}s:")
+        for stage, q in zip(self.stages, self.queues):
+            with stage.lock:
+                # Utilizzo = tempo occupato / (tempo totale * worker): ~100% indica il collo di bottiglia
+                utilization = stage.busy_seconds / (wall * stage.workers)
+                stats[stage.name] = {
+                    "workers": stage.workers,
+                    "queue_depth": q.qsize(),
+                    "max_queue_depth": stage.max_depth,
+                    "processed": stage.processed,
+                    "emitted": stage.emitted,
+                    "dropped": stage.dropped,
+                    "errors": stage.errors,
+                    "throughput_per_s": round(stage.processed / wall, 3),
+                    "avg_seconds": round(stage.busy_seconds / stage.processed, 3) if stage.processed else 0.0,
+                    "utilization": round(utilization, 3),
+                }
+            s = stats[stage.name]
+            print(f"      - {stage.name:<11} x{s['workers']} | coda {s['queue_depth']} (max {s['max_queue_depth']}) | "
+                  f"fatti {s['processed']} err {s['errors']} | {s['throughput_per_s']}/s | "
+                  f"avg {s['avg_seconds']}s | util {s['utilization']:.0%}")
+        return stats
+
+    def run(self, items: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Alimenta il primo stadio, attende lo svuotamento di tutti gli stadi e restituisce le statistiche."""
+        self._started = time.perf_counter()
+        self._done.clear()
+
+        threads: List[List[threading.Thread]] = []
+        for idx, stage in enumerate(self.stages):
+            group = [threading.Thread(target=self._worker, args=(idx,), name=f"{stage.name}-{n}", daemon=True)
+                     for n in range(stage.workers)]
+            for t in group:
+                t.start()
+            threads.append(group)
+
+        reporter = threading.Thread(target=self._reporter, name="pipeline-report", daemon=True)
+        reporter.start()
+
+        first = self.stages[0]
+        for item in items:
+            self.queues[0].put(item)
+            with first.lock:
+                first.max_depth = max(first.max_depth, self.queues[0].qsize())
+
+        # Shutdown ordinato: uno stadio si chiude solo quando il precedente ha finito
+        for idx, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self.queues[idx].put(_STOP)
+            for t in threads[idx]:
+                t.join()
+
+        self._done.set()
+        return self.report(final=True)
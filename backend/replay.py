@@ -0,0 +1,368 @@
+"""
+Modalità REPLAY: esegue la pipeline senza rete, sostituendo YouTube, Apify, Gemini, Truth Social
+e Supabase con fake basati su fixture, con latenza e errori (anche 429) iniettabili.
+Serve a misurare in modo deterministico throughput end-to-end e modifiche alla concorrenza.
+"""
+import os
+import json
+import time
+import random
+import re
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core.config import Config
+from core.metrics import METRICS
+from core.tickers import normalize_ticker
+from core.rate_limiter import APIFY_LIMITER, GEMINI_AIMD, AIMDController
+from database.stage_ledger import StageLedger
+from database.backfill_plan import BackfillPlan
+from core.near_duplicate import NearDuplicateIndex
+
+class ReplayRateLimitError(Exception):
+    """Errore 429 simulato (stesso testo che restituisce Gemini)."""
+    def __init__(self, service: str):
+        super().__init__(f"429 RESOURCE_EXHAUSTED (replay: {service})")
+
+class FaultInjector:
+    """
+    Latenza e fault deterministici: l'esito dipende solo da (seed, servizio, chiave, tentativo),
+    non dall'ordine in cui i thread arrivano.
+    """
+    def __init__(self, latency_ms: Dict[str, float], error_rate: float, rate_limit_rate: float, seed: int):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "FaultInjector":
+        latency = {}
+        for part in Config.REPLAY_LATENCY_MS.split(","):
+            if "=" in part:
+                name, value = part.split("=", 1)
+                latency[name.strip()] = float(value)
+        return cls(latency, Config.REPLAY_ERROR_RATE, Config.REPLAY_429_RATE, Config.REPLAY_SEED)
+
+    def call(self, service: str, key: str):
+        """Simula una chiamata remota: attende la latenza, poi può sollevare 429 o errore generico."""
+        with self._lock:
+            attempt = self._attempts.get(f"{service}:{key}", 0)
+            self._attempts[f"{service}:{key}"] = attempt + 1
+        rng = random.Random(f"{self.seed}:{service}:{key}:{attempt}")
+
+        base = self.latency_ms.get(service, 0.0) / 1000.0
+        time.sleep(base * rng.uniform(0.8, 1.2))
+
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            raise ReplayRateLimitError(service)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError(f"Errore simulato ({service})")
+
+def _with_retry(faults: FaultInjector, service: str, key: str, source: str, max_retries: int = 3,
+                controller: Optional[AIMDController] = None) -> bool:
+    """
+    Ripete la chiamata simulata sui 429, come fanno i servizi reali: con un controller AIMD
+    la pausa è quella condivisa del controller, altrimenti un backoff breve fisso.
+    """
+    for attempt in range(max_retries):
+        if attempt:
+            METRICS.inc("retries_total", service=service, source=source)
+        try:
+            with controller.permit() if controller else nullcontext():
+                faults.call(service, key)
+            return True
+        except ReplayRateLimitError:
+            METRICS.inc("http_429_total", service=service, source=source)
+            if not controller:
+                time.sleep(Config.REPLAY_BACKOFF_SECONDS * (attempt + 1))
+        except Exception as e:
+            print(f"      ⚠️ [REPLAY] {e}")
+            return False
+    return False
+
+# ==============================================================================
+# FIXTURE
+# ==============================================================================
+def synthetic_fixture(videos_per_channel: int, posts: int) -> Dict[str, Any]:
+    """Fixture sintetica (stesso formato dei file registrati) quando REPLAY_FIXTURES non è impostato."""
+    now = datetime.now(timezone.utc)
+    tickers = ["SPX500", "NQ100", "XAUUSD", "EURUSD", "BTCUSD", "WTI", "US10Y", "NVDA"]
+    fixture: Dict[str, Any] = {"videos": {}, "transcripts": {}, "analyses": {}, "truths": [], "truth_analyses": {}}
+
+    for c, handle in enumerate(Config.YOUTUBE_HANDLES):
+        items = []
+        for i in range(videos_per_channel):
+            vid = f"replay{c}x{i}"
+            url = f"https://www.youtube.com/watch?v={vid}"
+            items.append({
+                "id": vid,
+                "title": f"Analisi settimanale {handle} #{i}",
+                "date": (now - timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "url": url,
+                "ch_title": handle.lstrip("@")
+            })
+            # Livelli diversi per video: le trascrizioni non risultano near-duplicate tra loro
+            fixture["transcripts"][url] = " ".join(
+                f"Segmento {n}: il {tickers[(i + n) % len(tickers)]} rompe la struttura H4 sopra l'Order Block "
+                f"in zona {(c * 7919 + i * 104729 + n * 31) % 5000}."
+                for n in range(200)
+            )
+            fixture["analyses"][url] = {
+                "video_summary": f"Replay video {vid}",
+                "macro_sentiment": "RISK_ON",
+                "assets": [{
+                    "asset_ticker": tickers[(i + k) % len(tickers)],
+                    "asset_name": tickers[(i + k) % len(tickers)],
+                    "channel_style": "Tecnica",
+                    "sentiment": "Bullish",
+                    "recommendation": "LONG",
+                    "time_horizon": "Intraday",
+                    "key_drivers": ["Replay"],
+                    "summary_card": "Scenario simulato."
+                } for k in range(3)]
+            }
+        fixture["videos"][handle] = items
+
+    for i in range(posts):
+        url = f"https://truthsocial.com/@realDonaldTrump/replay{i}"
+        fixture["truths"].append({
+            "url": url,
+            "content": f"<p>TARIFFS on imports will change the economy. Replay post {i}.</p>",
+            "created_at": (now - timedelta(minutes=10 * i)).isoformat()
+        })
+        fixture["truth_analyses"][url] = {
+            "impact_score": i % 6,
+            "summary_it": f"Post replay {i}",
+            "assets_affected": ["TARIFFS", "DXY"] if i % 2 else [],
+            "trade_direction": "BEARISH"
+        }
+    return fixture
+
+def load_fixture() -> Dict[str, Any]:
+    if Config.REPLAY_FIXTURES:
+        with open(Config.REPLAY_FIXTURES, encoding="utf-8") as f:
+            return json.load(f)
+    return synthetic_fixture(Config.REPLAY_SYNTHETIC_VIDEOS, Config.REPLAY_SYNTHETIC_POSTS)
+
+# ==============================================================================
+# FAKE SERVICES (stessa interfaccia dei servizi reali)
+# ==============================================================================
+class ReplayYouTubeService:
+    def __init__(self, fixture: Dict[str, Any], faults: FaultInjector):
+        self.fixture = fixture
+        self.faults = faults
+
+    def get_videos(self, handle: str, mode: str = "LIVE", start=None, end=None, on_page=None) -> list:
+        with METRICS.time_stage("youtube_list", call="playlistItems"):
+            if not _with_retry(self.faults, "youtube", handle, "youtube"):
+                return []
+        videos = [dict(v) for v in self.fixture["videos"].get(handle, [])]
+        if on_page and mode == "BACKFILL":
+            on_page(handle, 1, len(videos), None)
+        return videos[:3] if mode == "LIVE" else videos
+
+class ReplayApifyService:
+    def __init__(self, fixture: Dict[str, Any], faults: FaultInjector):
+        self.fixture = fixture
+        self.faults = faults
+
+    def get_transcripts(self, video_urls: List[str]) -> tuple:
+        """Un run simulato per l'intero lotto, come il servizio reale."""
+        APIFY_LIMITER.acquire()
+        with METRICS.time_stage("apify_run", source="youtube"):
+            if not _with_retry(self.faults, "apify", video_urls[0] if video_urls else "", "youtube"):
+                return {}, {u: "run fallito" for u in video_urls}
+        results = {u: self.fixture["transcripts"][u] for u in video_urls if self.fixture["transcripts"].get(u)}
+        return results, {u: "trascrizione assente" for u in video_urls if u not in results}
+
+    def get_transcript(self, video_url: str) -> str:
+        APIFY_LIMITER.acquire()
+        with METRICS.time_stage("apify_run", source="youtube"):
+            if not _with_retry(self.faults, "apify", video_url, "youtube"):
+                return ""
+        return self.fixture["transcripts"].get(video_url, "")
+
+class ReplayAIService:
+    def __init__(self, fixture: Dict[str, Any], faults: FaultInjector):
+        self.fixture = fixture
+        self.faults = faults
+        # La risposta registrata si ritrova dalla trascrizione inviata
+        self._by_text = {text: url for url, text in fixture["transcripts"].items()}
+
+    def analyze_video(self, text: str, video_title: str, low_priority: bool = False,
+                      on_asset=None) -> Dict[str, Any]:
+        if not text or len(text) < 100: return {}
+        with METRICS.time_stage("gemini_call", source="youtube"):
+            if not _with_retry(self.faults, "gemini", video_title, "youtube", controller=GEMINI_AIMD):
+                return {}
+        analysis = self.fixture["analyses"].get(self._by_text.get(text, ""))
+        analysis = json.loads(json.dumps(analysis)) if analysis else {}
+        if on_asset and Config.AI_STREAMING:
+            for asset in analysis.get("assets") or []:
+                on_asset(asset)
+        return analysis
+
+class ReplayTrumpWatchService:
+    def __init__(self, fixture: Dict[str, Any], faults: FaultInjector):
+        self.fixture = fixture
+        self.faults = faults
+
+    def start_latest_truths(self, mode: str = "LIVE", since: Optional[datetime] = None, backfill_start=None):
+        # Nessun run reale da avviare: lo scrape simulato avviene in get_latest_truths
+        return None
+
+    def get_latest_truths(self, mode: str = "LIVE", since: Optional[datetime] = None, pending=None,
+                          watermark=None, backfill_start=None) -> list:
+        APIFY_LIMITER.acquire()
+        with METRICS.time_stage("apify_run", source="truth"):
+            if not _with_retry(self.faults, "apify", "truth_social", "truth"):
+                return []
+        return [dict(p) for p in self.fixture["truths"]]
+
+    def clean_html(self, raw_html):
+        return re.sub(r"<[^>]+>", " ", raw_html or "").strip()
+
+    def clean_html_batch(self, raw_htmls: list) -> list:
+        return [self.clean_html(raw) for raw in raw_htmls]
+
+    def analyze_market_impact(self, post_item, low_priority: bool = False):
+        with METRICS.time_stage("gemini_call", source="truth"):
+            if not _with_retry(self.faults, "gemini", post_item.get("url", ""), "truth", controller=GEMINI_AIMD):
+                return None
+        analysis = self.fixture["truth_analyses"].get(post_item.get("url"))
+        return dict(analysis) if analysis else None
+
+    def analyze_market_impact_batch(self, post_items: list, batch_size: Optional[int] = None,
+                                    low_priority: bool = False, texts: Optional[list] = None) -> list:
+        results: list = [None] * len(post_items)
+        for idx, analysis in self.iter_market_impact(post_items, batch_size, low_priority, texts):
+            results[idx] = analysis
+        return results
+
+    def iter_market_impact(self, post_items: list, batch_size: Optional[int] = None,
+                           low_priority: bool = False, texts: Optional[list] = None, skipped: Optional[set] = None):
+        """Una chiamata simulata per blocco, blocchi in parallelo e risultati in ordine di completamento, come il servizio reale."""
+        batch_size = batch_size or Config.TRUMP_BATCH_SIZE
+        batches = [list(range(i, min(i + batch_size, len(post_items)))) for i in range(0, len(post_items), batch_size)]
+
+        def run(batch):
+            with METRICS.time_stage("gemini_call", source="truth"):
+                return _with_retry(self.faults, "gemini", post_items[batch[0]].get("url", ""), "truth", controller=GEMINI_AIMD)
+
+        with ThreadPoolExecutor(max_workers=max(1, Config.TRUMP_WORKERS)) as pool:
+            futures = {pool.submit(run, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                for idx in futures[future]:
+                    analysis = self.fixture["truth_analyses"].get(post_items[idx].get("url")) if future.result() else None
+                    yield idx, dict(analysis) if analysis else None
+
+class ReplayMarketRepository:
+    """Repository in memoria: registra le scritture invece di inviarle a Supabase."""
+    def __init__(self, faults: FaultInjector):
+        self.faults = faults
+        self._known_urls: set = set()
+        self._lock = threading.Lock()
+        self.feeds: List[Dict[str, Any]] = []
+        self.insights = 0
+        # near-duplicate -> originale (raw_metadata.duplicates nel repository reale)
+        self.links: Dict[str, str] = {}
+
+    def prefetch_known_urls(self, feed_type: Optional[str] = None, since: Optional[str] = None) -> int:
+        return 0
+
+    def filter_new_urls(self, urls: Iterable[str]) -> List[str]:
+        return [u for u in dict.fromkeys(urls) if u and u not in self._known_urls]
+
+    def mark_known(self, url: str):
+        if url:
+            self._known_urls.add(url)
+
+    def video_exists(self, url: str) -> bool:
+        return url in self._known_urls
+
+    def link_duplicate(self, url: str, original_url: str) -> bool:
+        if not self._write(url, "intelligence_feed"):
+            return False
+        with self._lock:
+            self.links[url] = original_url
+        self._known_urls.add(url)
+        return True
+
+    def prepare_insight(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(item, asset_ticker=normalize_ticker(item.get("asset_ticker")))
+
+    def print_asset_report(self):
+        # Nessuna tabella 'assets' simulata nel replay
+        pass
+
+    def _write(self, url: str, table: str) -> bool:
+        with METRICS.time_stage("db_write", table=table):
+            return _with_retry(self.faults, "db", url, "db")
+
+    def save_trump_signal(self, signal_data: Dict[str, Any]) -> bool:
+        if not self._write(signal_data['url'], "intelligence_feed"):
+            return False
+        with self._lock:
+            self.feeds.append({"url": signal_data['url'], "feed_type": "SOCIAL_POST"})
+            self.insights += len(signal_data.get('ai_analysis', {}).get('assets_affected', []))
+        self._known_urls.add(signal_data['url'])
+        return True
+
+    def save_analysis_transaction(self, video_data: Dict[str, Any], analysis: Dict[str, Any]) -> bool:
+        if not self._write(video_data['url'], "intelligence_feed"):
+            return False
+        with self._lock:
+            self.feeds.append({"url": video_data['url'], "feed_type": "VIDEO"})
+            self.insights += len(analysis.get("assets", []))
+        self._known_urls.add(video_data['url'])
+        return True
+
+def build_replay_context(fixture: dict, faults: "FaultInjector"):
+    """WorkerContext sui fake, con ledger, indice near-duplicate e piano di backfill dedicati (svuotati)."""
+    from backend.orchestrator import WorkerContext
+
+    # Ledger e indice near-duplicate separati: il replay non tocca lo stato dei run reali
+    ledger = StageLedger(os.path.join(Config.LOCAL_STATE_DIR, "replay_ledger.sqlite"))
+    ledger.clear(Config.REPLAY_BASE_MODE)
+    near_dups = NearDuplicateIndex(os.path.join(Config.LOCAL_STATE_DIR, "replay_near_dup.sqlite"))
+    near_dups.clear()
+    plan = BackfillPlan(os.path.join(Config.LOCAL_STATE_DIR, "replay_backfill_plan.sqlite"))
+    plan.clear()
+
+    return WorkerContext(
+        repo=ReplayMarketRepository(faults),
+        yt=ReplayYouTubeService(fixture, faults),
+        trump_truth=ReplayTrumpWatchService(fixture, faults),
+        apify=ReplayApifyService(fixture, faults),
+        ai=ReplayAIService(fixture, faults),
+        ledger=ledger,
+        near_dups=near_dups,
+        plan=plan,
+    )
+
+
+def run_replay():
+    """Esegue la pipeline completa sui fake e stampa throughput end-to-end."""
+    from backend.orchestrator import run_pipeline
+
+    fixture = load_fixture()
+    faults = FaultInjector.from_config()
+    print(f"🎬 REPLAY | Fixture: {Config.REPLAY_FIXTURES or 'sintetica'} | Latenze ms: {faults.latency_ms} | "
+          f"Errori: {faults.error_rate:.0%} | 429: {faults.rate_limit_rate:.0%} | Seed: {faults.seed}")
+
+    ctx = build_replay_context(fixture, faults)
+    repo = ctx.repo
+
+    t0 = time.perf_counter()
+    run_pipeline(Config.REPLAY_BASE_MODE, ctx)
+    elapsed = time.perf_counter() - t0
+
+    print(f"🏁 REPLAY END | {len(repo.feeds)} feed, {repo.insights} insights in {elapsed:.2f}s "
+          f"({len(repo.feeds) / max(elapsed, 1e-9):.2f} item/s)")
+    return {"elapsed_seconds": elapsed, "feeds": len(repo.feeds), "insights": repo.insights}
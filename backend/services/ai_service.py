@@ -1,24 +1,213 @@
 import json
 import time
 import re
-from typing import Dict, Any, List
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable, Optional
 from google import genai
 from google.genai import types
 from core.config import Config
+from core.rate_limiter import GEMINI_AIMD, is_rate_limit_error
+from core.metrics import METRICS
+from core.ai_cache import AICache
+from core.token_budget import TokenLedger
+from core.json_stream import StreamingArrayParser
+from core.transcript_compactor import compact_transcript
+from core.tickers import normalize_ticker
 
 class AIService:
+    MODEL = "gemini-flash-latest"
+    # Da incrementare a ogni modifica del prompt: invalida le risposte in cache
+    PROMPT_VERSION = "video-v2"
+
     def __init__(self):
         self.client = genai.Client(api_key=Config.GOOGLE_API_KEY)
+        self.cache = AICache() if Config.AI_CACHE_ENABLED else None
+        self.quota = TokenLedger()
 
-    def analyze_video(self, text: str, video_title: str) -> Dict[str, Any]:
+    def analyze_video(self, text: str, video_title: str, low_priority: bool = False,
+                      on_asset: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
         """
         Analizza la trascrizione ed estrae insights strutturati per il DB.
+        Le trascrizioni lunghe sono divise in blocchi sovrapposti analizzati in parallelo
+        (map) e poi fuse nello stesso schema, con asset deduplicati per ticker (reduce).
+        `on_asset` riceve ogni asset (per ticker) una sola volta per chiamata: con Config.AI_STREAMING
+        appena Gemini lo chiude, anche se un 429 a metà stream fa ripetere la richiesta.
+        Con più blocchi riceve solo gli asset fusi, a fine reduce; i restanti (es. analisi dalla cache)
+        sono consegnati alla fine.
+        Solleva QuotaExceededError se il budget token giornaliero non copre il prompt.
         """
+        text = self._compact(text)
         if not text or len(text) < 100: return {}
-        
-        # Troncatura per sicurezza (Gemini 2.0 Flash ha una finestra ampia, ma stiamo sicuri)
-        truncated_text = text[:Config.MAX_CHARS_AI]
-        
+
+        deliver = self._deliver_once(on_asset) if on_asset else None
+        chunks = self._split_chunks(text)
+        if len(chunks) == 1:
+            result = self._analyze_chunk(chunks[0], video_title, low_priority=low_priority, on_asset=deliver)
+        else:
+            print(f"      🧩 Trascrizione lunga ({len(text)} caratteri): {len(chunks)} blocchi in parallelo")
+            with ThreadPoolExecutor(max_workers=Config.AI_CHUNK_WORKERS) as pool:
+                partials = list(pool.map(
+                    lambda item: self._analyze_chunk(item[1], video_title, f" (parte {item[0] + 1}/{len(chunks)})",
+                                                     low_priority=low_priority),
+                    enumerate(chunks)
+                ))
+            result = self._merge_partials([p for p in partials if p])
+
+        if deliver and result:
+            for asset in result.get("assets") or []:
+                if isinstance(asset, dict):
+                    deliver(asset)
+
+        self.quota.add_insights(self.MODEL, "youtube", len(result.get("assets") or []) if result else 0)
+        return result
+
+    @staticmethod
+    def _compact(text: str) -> str:
+        """Trascrizione grezza (un segmento per riga) compattata per il prompt: meno token e latenza più bassa."""
+        if not text or not Config.TRANSCRIPT_COMPACTION:
+            return text
+        segments = text.split("\n")
+        with METRICS.time_stage("transcript_compaction"):
+            clean_text, ratio = compact_transcript(segments)
+        if clean_text:
+            METRICS.observe("transcript_compression_ratio", ratio)
+            print(f"      🗜️ Compattazione: {len(text)} -> {len(clean_text)} caratteri (x{ratio:.2f})")
+        return clean_text
+
+    @staticmethod
+    def _deliver_once(on_asset: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], None]:
+        """Avvolge `on_asset` perché ogni ticker sia consegnato una sola volta (retry e fine analisi)."""
+        delivered: set = set()
+        lock = threading.Lock()
+
+        def deliver(asset: Dict[str, Any]):
+            ticker = normalize_ticker(asset.get("asset_ticker"))
+            with lock:
+                if ticker in delivered:
+                    return
+                delivered.add(ticker)
+            on_asset(asset)
+        return deliver
+
+    @staticmethod
+    def _split_chunks(text: str) -> List[str]:
+        """
+        Blocchi di Config.AI_CHUNK_CHARS con Config.AI_CHUNK_OVERLAP di sovrapposizione,
+        tagliati su uno spazio per non spezzare le parole. Oltre Config.MAX_CHARS_AI si tronca.
+        """
+        text = text[:Config.MAX_CHARS_AI]
+        size = Config.AI_CHUNK_CHARS
+        if len(text) <= size:
+            return [text]
+
+        chunks = []
+        start = 0
+        while start < len(text):
+            end = min(start + size, len(text))
+            if end < len(text):
+                cut = text.rfind(" ", start + size // 2, end)
+                end = cut if cut > 0 else end
+            chunks.append(text[start:end])
+            if end >= len(text):
+                break
+            start = max(end - Config.AI_CHUNK_OVERLAP, start + 1)
+            space = text.find(" ", start, end)
+            start = space + 1 if space > 0 else start
+        return chunks
+
+    @staticmethod
+    def _merge_partials(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Fonde le analisi dei blocchi in {video_summary, macro_sentiment, assets[]}."""
+        if not partials:
+            return {}
+
+        sentiments = Counter(p.get("macro_sentiment") for p in partials if p.get("macro_sentiment"))
+        merged: Dict[str, Any] = {
+            "video_summary": next((p["video_summary"] for p in partials if p.get("video_summary")), "N/A"),
+            "macro_sentiment": sentiments.most_common(1)[0][0] if sentiments else "NEUTRAL",
+            "assets": []
+        }
+
+        by_ticker: Dict[str, Dict[str, Any]] = {}
+        for partial in partials:
+            for asset in partial.get("assets") or []:
+                if not isinstance(asset, dict):
+                    continue
+                ticker = normalize_ticker(asset.get("asset_ticker"))
+                current = by_ticker.get(ticker)
+                if current is None:
+                    by_ticker[ticker] = dict(asset, asset_ticker=ticker)
+                    continue
+                # Stesso asset in più blocchi: completa i campi mancanti e unisce i driver
+                for field, value in asset.items():
+                    if value and not current.get(field):
+                        current[field] = value
+                drivers = list(dict.fromkeys((current.get("key_drivers") or []) + (asset.get("key_drivers") or [])))
+                current["key_drivers"] = drivers[:3]
+
+        merged["assets"] = list(by_ticker.values())
+        return merged
+
+    def _generate_streaming(self, prompt: str, on_asset: Optional[Callable[[Dict[str, Any]], Any]] = None) -> tuple:
+        """
+        Chiamata Gemini in streaming: l'array `assets` è letto in modo incrementale e ogni asset
+        completo è normalizzato e passato a `on_asset` senza attendere la fine della risposta.
+        Restituisce (analisi, usage, completa). Uno stream interrotto tiene gli asset già chiusi.
+        """
+        parser = StreamingArrayParser("assets")
+        usage = None
+        first_asset = True
+        t0 = time.perf_counter()
+        try:
+            stream = self.client.models.generate_content_stream(
+                model=self.MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    temperature=0.0
+                )
+            )
+            for chunk in stream:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                for asset in parser.feed(chunk.text or ""):
+                    if first_asset:
+                        first_asset = False
+                        METRICS.observe("gemini_first_asset_seconds", time.perf_counter() - t0, source="youtube")
+                    asset["asset_ticker"] = normalize_ticker(asset.get("asset_ticker"))
+                    if on_asset:
+                        on_asset(asset)
+        except Exception as e:
+            # Un 429 prima di ricevere dati va gestito dal retry; a stream avviato si recupera il parziale
+            if is_rate_limit_error(e) or not parser.text:
+                raise
+            print(f"      ⚠️ Stream Gemini interrotto: {e}")
+
+        with METRICS.time_stage("json_parse", source="youtube"):
+            parsed = parser.result()
+        if parsed is not None:
+            # Stessi oggetti già passati a on_asset (ticker normalizzati)
+            if len(parser.items) == len(parsed.get("assets") or []):
+                parsed["assets"] = parser.items
+            return parsed, usage, True
+
+        METRICS.inc("gemini_stream_truncated_total", source="youtube")
+        recovered = parser.recover("video_summary", "macro_sentiment")
+        print(f"      🩹 Stream troncato: recuperati {len(recovered['assets'])} asset completi")
+        return (recovered if recovered["assets"] else {}), usage, False
+
+    def _analyze_chunk(self, text: str, video_title: str, part_note: str = "", low_priority: bool = False,
+                       on_asset: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
+        """Singola chiamata Gemini (con cache e retry) su un blocco di trascrizione."""
+        # Cache per contenuto: stesso input + stesso prompt + stesso modello = nessuna chiamata
+        cache_key = AICache.make_key(f"{video_title}{part_note}\n{text}", self.PROMPT_VERSION, self.MODEL)
+        if self.cache:
+            cached = self.cache.get(cache_key, source="youtube")
+            if cached:
+                print("      ⚡ Analisi AI dalla cache")
+                return cached
+
         prompt = f"""
         # Ruolo
         Agisci come un Analista Finanziario AI Senior. Analizza la trascrizione del video, identifica il tipo di analisi e estrai dati strutturati per una Dashboard di Trading.
@@ -69,39 +258,63 @@ class AIService:
         }}
 
         # Input Dati
-        Titolo Video: {video_title}
+        Titolo Video: {video_title}{part_note}
         Trascrizione:
-        {truncated_text}
+        {text}
         """
 
-        # --- LOGICA DI RETRY (Exponential Backoff) ---
+        # Stima pre-flight: oltre il budget giornaliero il blocco viene rinviato, non inviato
+        estimated = self.quota.estimate(prompt)
+        self.quota.check(estimated, low_priority, source="youtube")
+
+        # --- LOGICA DI RETRY ---
+        # Concorrenza e pause dopo un 429 sono gestite dal controller AIMD condiviso con Trump Watch
         max_retries = 5
-        wait_time = 60 
 
         for attempt in range(max_retries):
             try:
-                res = self.client.models.generate_content(
-                    model="gemini-flash-latest", 
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        response_mime_type="application/json",
-                        temperature=0.0 # Temperatura bassa per output deterministico
+                if attempt:
+                    METRICS.inc("retries_total", service="gemini", source="youtube")
+                if Config.AI_STREAMING:
+                    with GEMINI_AIMD.permit(), METRICS.time_stage("gemini_call", source="youtube"):
+                        parsed, usage, complete = self._generate_streaming(prompt, on_asset)
+                    self.quota.record(self.MODEL, "youtube", estimated, getattr(usage, "total_token_count", None) if usage else None)
+                    if not parsed:
+                        continue
+                    # Un'analisi recuperata da uno stream troncato non entra in cache
+                    if self.cache and complete:
+                        self.cache.put(cache_key, parsed)
+                    return parsed
+
+                with GEMINI_AIMD.permit(), METRICS.time_stage("gemini_call", source="youtube"):
+                    res = self.client.models.generate_content(
+                        model=self.MODEL, 
+                        contents=prompt,
+                        config=types.GenerateContentConfig(
+                            response_mime_type="application/json",
+                            temperature=0.0 # Temperatura bassa per output deterministico
+                        )
                     )
-                )
                 
+                usage = getattr(res, "usage_metadata", None)
+                self.quota.record(self.MODEL, "youtube", estimated, getattr(usage, "total_token_count", None) if usage else None)
+
                 raw_json = res.text
                 if not raw_json:
                     continue
                 # Pulizia nel caso Gemini inserisca markdown
                 clean_json = raw_json.replace("```json", "").replace("```", "").strip()
                 
-                return json.loads(clean_json)
+                with METRICS.time_stage("json_parse", source="youtube"):
+                    parsed = json.loads(clean_json)
+                if self.cache and parsed:
+                    self.cache.put(cache_key, parsed)
+                return parsed if isinstance(parsed, dict) else {}
 
             except Exception as e:
                 print(f"      ⚠️ Errore AI (Tentativo {attempt+1}): {e}")
-                if "429" in str(e): # Rate limit
-                    time.sleep(wait_time)
-                    wait_time += 30
+                if is_rate_limit_error(e): # Rate limit: il prossimo permesso attende il backoff condiviso
+                    METRICS.inc("http_429_total", service="gemini", source="youtube")
                 else:
                     break
         
@@ -1,69 +1,145 @@
+import re
+from typing import Dict, List, Optional, Tuple
 from apify_client import ApifyClient
 from core.config import Config
+from core.rate_limiter import APIFY_LIMITER
+from core.metrics import METRICS
+from core.transcript_store import TranscriptStore
+from core.apify_runner import ApifyRunner
+
+_VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|shorts/|embed/)([\w-]{11})")
 
 class ApifyService:
+    # Chiavi in cui lo scraper riporta l'URL/ID del video di origine di ogni item
+    SOURCE_KEYS = ("videoUrl", "url", "inputUrl", "input", "videoId", "id")
+
     def __init__(self):
         self.client = ApifyClient(Config.APIFY_TOKEN)
+        self.runner = ApifyRunner(self.client)
+        self.store = TranscriptStore() if Config.TRANSCRIPT_STORE_ENABLED else None
 
-    def get_transcript(self, video_url: str) -> str:
+    @staticmethod
+    def video_id(value) -> Optional[str]:
+        """ID YouTube (11 caratteri) da un URL watch/shorts/youtu.be o da un ID nudo."""
+        if not isinstance(value, str):
+            return None
+        match = _VIDEO_ID_RE.search(value)
+        if match:
+            return match.group(1)
+        return value if re.fullmatch(r"[\w-]{11}", value) else None
+
+    @staticmethod
+    def _segments(item: dict) -> List[str]:
+        """Testo di un item del dataset (logica di estrazione originale, robusta ai vari formati)."""
+        texts: List[str] = []
+        # Cerchiamo i dati dentro 'data' (comune in questo scraper)
+        data_content = item.get("data")
+        
+        # CASO 1: 'data' è una Lista di segmenti (es. timestamp + testo)
+        if isinstance(data_content, list):
+            for segment in data_content:
+                if isinstance(segment, dict):
+                    # Priorità alle chiavi comuni: text > caption > transcript
+                    txt = segment.get("text") or segment.get("caption") or segment.get("transcript")
+                    if txt: 
+                        texts.append(str(txt))
+                    
+        # CASO 2: 'data' è una Stringa diretta
+        elif isinstance(data_content, str):
+            texts.append(data_content)
+        
+        # CASO 3: Fallback (livello radice dell'item)
+        # Se 'data' è vuoto o null, cerchiamo direttamente 'text' o 'transcript' nella root
+        else:
+            txt = item.get("text") or item.get("transcript") or item.get("caption")
+            if txt: 
+                texts.append(str(txt))
+        return texts
+
+    def get_transcripts(self, video_urls: List[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
         """
-        Scarica la trascrizione usando Apify.
-        Logica di parsing ripristinata alla versione originale robusta.
+        Scarica le trascrizioni di più video con UN solo run dell'Actor (avvio pagato una volta).
+        I video già presenti nel TranscriptStore locale non vengono richiesti ad Apify.
+        Restituisce (trascrizioni grezze per URL, un segmento per riga, motivo del fallimento per URL).
+        La compattazione per il prompt avviene in AIService: nel feed si salva il testo originale.
         """
-        print(f"   ☁️ [APIFY] Richiesta per: {video_url}")
-        
+        urls = list(dict.fromkeys(u for u in video_urls if u))
+        segments: Dict[str, List[str]] = {}
+        if self.store:
+            for url in urls:
+                raw = self.store.get(self.video_id(url) or url)
+                if raw is not None:
+                    segments[url] = raw.split("\n")
+            if segments:
+                print(f"   🗄️ Transcript store: {len(segments)}/{len(urls)} trascrizioni locali | {self.store.stats()}")
+
+        to_fetch = [u for u in urls if u not in segments]
+        failures: Dict[str, str] = {}
+        if to_fetch:
+            fetched, failures = self._run_batch(to_fetch)
+            for url, parts in fetched.items():
+                if self.store:
+                    self.store.put(self.video_id(url) or url, "\n".join(parts))
+                segments[url] = parts
+
+        results: Dict[str, str] = {}
+        for url in urls:
+            text = "\n".join(segments.get(url) or []).strip()
+            if text:
+                results[url] = text
+            else:
+                failures.setdefault(url, "dataset vuoto o formato non riconosciuto")
+        if urls:
+            print(f"      ✅ Trascrizioni OK: {len(results)}/{len(urls)}")
+        return results, failures
+
+    def _run_batch(self, urls: List[str]) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+        """
+        Un run dell'Actor per tutti gli URL: il dataset è letto in streaming e ogni item
+        è ricondotto al suo URL tramite l'ID video. Restituisce (segmenti per URL, fallimenti).
+        """
+        print(f"   ☁️ [APIFY] Run unico per {len(urls)} video")
+        by_id = {self.video_id(u): u for u in urls}
+
         try:
-            # Avvia l'Actor
-            run = self.client.actor(Config.APIFY_ACTOR_ID).call(run_input={"videoUrls": [video_url]})
+            # Avvia l'Actor (rispettando la quota Apify condivisa): lo stato è seguito dal poller
+            # del runner, con timeout per run, mentre gli altri stadi della pipeline proseguono
+            APIFY_LIMITER.acquire()
+            with METRICS.time_stage("apify_run", source="youtube"):
+                run = self.runner.start(Config.APIFY_ACTOR_ID, {"videoUrls": urls}).result()
+            METRICS.observe("apify_batch_size", len(urls))
             
             if not run:
                 print("      ❌ Apify Run Failed (No run object returned)")
-                return ""
+                return {}, {u: "run non avviato" for u in urls}
             
             # Se lo stato non è SUCCEEDED, è inutile provare a leggere
             if run.get('status') != 'SUCCEEDED':
                 print(f"      ❌ Apify Run Failed with status: {run.get('status')}")
-                return ""
+                return {}, {u: f"run {run.get('status')}" for u in urls}
 
-            full_text = []
-            dataset_items = self.client.dataset(run["defaultDatasetId"]).iterate_items()
-            
-            # --- LOGICA DI ESTRAZIONE ORIGINALE (ROBUSTA) ---
-            for item in dataset_items:
+            segments: Dict[str, List[str]] = {}
+            unmapped = 0
+            for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
                 if not isinstance(item, dict): continue
-                
-                # Cerchiamo i dati dentro 'data' (comune in questo scraper)
-                data_content = item.get("data")
-                
-                # CASO 1: 'data' è una Lista di segmenti (es. timestamp + testo)
-                if isinstance(data_content, list):
-                    for segment in data_content:
-                        if isinstance(segment, dict):
-                            # Priorità alle chiavi comuni: text > caption > transcript
-                            txt = segment.get("text") or segment.get("caption") or segment.get("transcript")
-                            if txt: 
-                                full_text.append(str(txt))
-                            
-                # CASO 2: 'data' è una Stringa diretta
-                elif isinstance(data_content, str):
-                    full_text.append(data_content)
-                
-                # CASO 3: Fallback (livello radice dell'item)
-                # Se 'data' è vuoto o null, cerchiamo direttamente 'text' o 'transcript' nella root
-                else:
-                    txt = item.get("text") or item.get("transcript") or item.get("caption")
-                    if txt: 
-                        full_text.append(str(txt))
+                url = urls[0] if len(urls) == 1 else None
+                for key in self.SOURCE_KEYS:
+                    url = url or by_id.get(self.video_id(item.get(key)))
+                if url is None:
+                    unmapped += 1
+                    continue
+                segments.setdefault(url, []).extend(self._segments(item))
+            if unmapped:
+                print(f"      ⚠️ {unmapped} item del dataset senza URL di origine riconoscibile")
+            return {u: parts for u, parts in segments.items() if parts}, {}
 
-            clean_text = " ".join(full_text).strip()
-            
-            if clean_text:
-                print(f"      ✅ Trascrizione OK: {len(clean_text)} caratteri")
-                return clean_text
-            else:
-                print("      ⚠️ Dataset vuoto o formato non riconosciuto.")
-                return ""
-            
         except Exception as e:
             print(f"      ❌ Eccezione Apify: {e}")
-            return ""
\ No newline at end of file
+            return {}, {u: f"eccezione: {e}" for u in urls}
+
+    def get_transcript(self, video_url: str) -> str:
+        """Trascrizione di un singolo video (run dedicato): preferire get_transcripts per i lotti."""
+        results, failures = self.get_transcripts([video_url])
+        if video_url in failures:
+            print(f"      ⚠️ {failures[video_url]}")
+        return results.get(video_url, "")
@@ -1,29 +1,70 @@
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Optional
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from core.config import Config
+from core.metrics import METRICS
+from core.channel_cache import ChannelCache
 
 class YouTubeService:
     def __init__(self):
-        self.service = build('youtube', 'v3', developerKey=Config.GOOGLE_API_KEY)
+        # httplib2 non è thread-safe: un client per thread del pool
+        self._local = threading.local()
+        # handle -> uploads playlist, titolo e stato dell'ultimo sync LIVE (persistente tra i run)
+        self.channels = ChannelCache()
 
-    def get_videos(self, handle: str, mode: str = "LIVE") -> list:
+    @property
+    def service(self):
+        if getattr(self._local, "service", None) is None:
+            self._local.service = build('youtube', 'v3', developerKey=Config.GOOGLE_API_KEY)
+        return self._local.service
+
+    @staticmethod
+    def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+        """Datetime in UTC senza tzinfo, confrontabile con publishedAt parsato."""
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def get_videos(self, handle: str, mode: str = "LIVE", start: Optional[datetime] = None,
+                   end: Optional[datetime] = None, on_page: Optional[Callable] = None) -> list:
+        """
+        Video del canale. LIVE: gli ultimi 3. BACKFILL: quelli pubblicati tra `start` e `end`
+        (default Config.YOUTUBE_BACKFILL_START/END), fermandosi al primo video più vecchio di `start`.
+        `on_page(handle, pagine, video nel range, data più vecchia)` riceve l'avanzamento del BACKFILL.
+        """
         videos = []
         
         # --- CONFIGURAZIONE DATE PER BACKFILL ---
-        BACKFILL_START_DATE = datetime(2026, 2, 9)
-        BACKFILL_END_DATE = datetime(2026, 2, 15, 00, 00, 00)
+        BACKFILL_START_DATE = self.naive_utc(start) or datetime.fromisoformat(Config.YOUTUBE_BACKFILL_START)
+        BACKFILL_END_DATE = self.naive_utc(end) or datetime.fromisoformat(Config.YOUTUBE_BACKFILL_END)
+        pages = 0
+        oldest = None
         
         print(f"   📡 YouTube Fetch: {handle} | Mode: {mode}")
 
         try:
-            # 1. Ottieni ID Uploads del canale
-            res = self.service.channels().list(part="contentDetails,snippet", forHandle=handle).execute()
-            if not res.get('items'):
-                print(f"      ⚠️ Canale non trovato: {handle}")
-                return []
-            
-            upl_id = res['items'][0]['contentDetails']['relatedPlaylists']['uploads']
-            ch_title = res['items'][0]['snippet']['title']
+            # 1. Ottieni ID Uploads del canale (cache persistente: channels().list solo al primo run o a TTL scaduto)
+            channel = self.channels.get(handle)
+            if not channel:
+                with METRICS.time_stage("youtube_list", call="channels"):
+                    res = self.service.channels().list(part="contentDetails,snippet", forHandle=handle).execute()
+                if not res.get('items'):
+                    print(f"      ⚠️ Canale non trovato: {handle}")
+                    return []
+                channel = {
+                    "playlist_id": res['items'][0]['contentDetails']['relatedPlaylists']['uploads'],
+                    "title": res['items'][0]['snippet']['title'],
+                    "etag": None, "newest_video_id": None, "recent": [],
+                }
+                self.channels.put_channel(handle, channel["playlist_id"], channel["title"])
+
+            upl_id, ch_title = channel["playlist_id"], channel["title"]
+            live = (mode == "LIVE")
+            first_etag = None
+            newest_id = None
+            reached_known = False
             
             # 2. Loop di Paginazione (Fondamentale per il Backfill)
             next_page_token = None
@@ -31,14 +72,33 @@ class YouTubeService:
             
             while searching:
                 # Richiediamo sempre 50 item per pagina per ottimizzare le quote API
-                pl = self.service.playlistItems().list(
+                request = self.service.playlistItems().list(
                     part="snippet", 
                     playlistId=upl_id, 
                     maxResults=50, 
                     pageToken=next_page_token
-                ).execute()
+                )
+                conditional = live and next_page_token is None and channel["etag"]
+                if conditional:
+                    # Richiesta condizionale: 304 se la playlist non è cambiata dall'ultimo sync LIVE
+                    etag = channel["etag"]
+                    request.headers["If-None-Match"] = etag if etag.startswith('"') else f'"{etag}"'
+                try:
+                    with METRICS.time_stage("youtube_list", call="playlistItems"):
+                        pl = request.execute()
+                except HttpError as e:
+                    if conditional and e.resp.status == 304:
+                        METRICS.inc("youtube_conditional_total", result="not_modified")
+                        print(f"      💤 Playlist invariata (ETag): {len(channel['recent'])} video dall'ultimo sync")
+                        return [dict(v) for v in channel["recent"]]
+                    raise
+                if conditional:
+                    METRICS.inc("youtube_conditional_total", result="modified")
+                if next_page_token is None:
+                    first_etag = pl.get('etag')
                 
                 items = pl.get('items', [])
+                pages += 1
                 if not items:
                     break
 
@@ -46,9 +106,18 @@ class YouTubeService:
                     video_id = i['snippet']['resourceId']['videoId']
                     title = i['snippet']['title']
                     pub_str = i['snippet']['publishedAt'] # Es: 2026-01-28T10:00:00Z
+
+                    if live:
+                        newest_id = newest_id or video_id
+                        if video_id == channel["newest_video_id"]:
+                            # Da qui in giù tutto già visto al sync precedente: stop paginazione
+                            reached_known = True
+                            searching = False
+                            break
                     
                     # Parsifica la data (rimuovendo la Z finale per compatibilità datetime base)
                     pub_dt = datetime.strptime(pub_str.replace('Z', ''), "%Y-%m-%dT%H:%M:%S")
+                    oldest = pub_dt if oldest is None else min(oldest, pub_dt)
 
                     # Filtraggio video @Market.Mind.trading
                     if "marketmind" in ch_title.lower():
@@ -96,10 +165,21 @@ class YouTubeService:
                         # Se il video è più recente della data di fine (futuro rispetto al range), continuiamo a cercare
                         # (non facciamo nulla in questo ramo else)
 
+                if on_page and mode == "BACKFILL":
+                    on_page(handle, pages, len(videos), oldest)
+
                 # Gestione Paginazione
                 next_page_token = pl.get('nextPageToken')
                 if not next_page_token or not searching:
                     break
+
+            if live:
+                if reached_known:
+                    # Il listing si completa con i video del sync precedente (non ancora scartati dal dedup)
+                    seen = {v['id'] for v in videos}
+                    videos = (videos + [dict(v) for v in channel["recent"] if v['id'] not in seen])[:3]
+                    METRICS.inc("youtube_known_stop_total")
+                self.channels.put_sync(handle, first_etag, newest_id, videos)
                     
         except Exception as e:
             print(f"❌ YouTube API Error ({handle}): {e}")
@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Optional
+from core.config import Config
+from core.metrics import METRICS
+
+class AICache:
+    """
+    Cache persistente (SQLite) delle risposte Gemini, indirizzata per contenuto:
+    chiave = sha256(testo normalizzato + versione prompt + modello).
+    Un item rielaborato (DB fallito, backfill ripetuto) non consuma quota;
+    cambiare PROMPT_VERSION invalida automaticamente le vecchie voci.
+    Eviction LRU per dimensione totale + TTL.
+    """
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None, ttl_days: Optional[float] = None):
+        self.path = path or os.path.join(Config.LOCAL_STATE_DIR, "ai_cache.sqlite")
+        self.max_bytes = max_bytes if max_bytes is not None else Config.AI_CACHE_MAX_MB * 1024 * 1024
+        self.ttl_seconds = (ttl_days if ttl_days is not None else Config.AI_CACHE_TTL_DAYS) * 86400
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_access ON ai_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text: str, prompt_version: str, model: str) -> str:
+        normalized = re.sub(r"\s+", " ", text or "").strip()
+        return hashlib.sha256(f"{prompt_version}\x00{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str, source: str = "") -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row:
+                self._conn.execute("UPDATE ai_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+
+        METRICS.inc("ai_cache_total", result="hit" if row else "miss", source=source)
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, size_bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Rimuove le voci scadute e poi le meno usate finché si rientra in max_bytes (chiamare sotto lock)."""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM ai_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM ai_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size_bytes FROM ai_cache ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        METRICS.inc("ai_cache_evictions_total", evicted)
@@ -0,0 +1,137 @@
+import time
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+from core.config import Config
+from core.metrics import METRICS
+
+TERMINAL_STATUSES = {"SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT"}
+
+class ApifyRun:
+    """
+    Run Apify avviato in modo non bloccante. `result()` attende lo stato finale e
+    restituisce l'oggetto run (come `actor().call()`); `cancel()` interrompe il run.
+    """
+    def __init__(self, runner: "ApifyRunner", run_id: str, actor_id: str, timeout: Optional[float]):
+        self.runner = runner
+        self.run_id = run_id
+        self.actor_id = actor_id
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.future: Future = Future()
+        self.next_poll = self.started + Config.APIFY_POLL_MIN_SECONDS
+        self.interval = Config.APIFY_POLL_MIN_SECONDS
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return self.future.result(timeout=timeout)
+
+    def cancel(self, reason: str = "ABORTED"):
+        self.runner.abort(self, reason)
+
+class ApifyRunner:
+    """
+    Avvia run Apify con `actor().start()` e ne segue lo stato da un unico thread di polling
+    (backoff esponenziale tra Config.APIFY_POLL_MIN_SECONDS e APIFY_POLL_MAX_SECONDS),
+    invece di bloccare un thread per run con `actor().call()`. Più run procedono in parallelo
+    mentre la pipeline continua (listing YouTube, analisi Gemini); ogni run ha un timeout
+    e può essere annullato singolarmente o tutti insieme (stop del demone).
+    """
+    _instances: "weakref.WeakSet[ApifyRunner]" = weakref.WeakSet()
+
+    def __init__(self, client):
+        self.client = client
+        self._runs: List[ApifyRun] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        ApifyRunner._instances.add(self)
+
+    def start(self, actor_id: str, run_input: Dict[str, Any], timeout: Optional[float] = None) -> ApifyRun:
+        """Avvia il run e ritorna subito; il risultato arriva su `ApifyRun.result()`."""
+        timeout = Config.APIFY_RUN_TIMEOUT_SECONDS if timeout is None else timeout
+        with METRICS.time_stage("apify_start", actor=actor_id):
+            started = self.client.actor(actor_id).start(run_input=run_input)
+        run = ApifyRun(self, started["id"], actor_id, timeout)
+        if started.get("status") in TERMINAL_STATUSES:
+            run.future.set_result(started)
+            return run
+
+        with self._cond:
+            self._runs.append(run)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_loop, name="apify-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return run
+
+    def _claim(self, run: ApifyRun) -> bool:
+        """
+        Toglie il run da quelli seguiti: solo chi lo toglie (poller, abort, signal handler del demone)
+        ne risolve il risultato, così set_result non viene mai chiamato due volte.
+        """
+        with self._cond:
+            if run in self._runs:
+                self._runs.remove(run)
+                return True
+        return False
+
+    def abort(self, run: ApifyRun, reason: str = "ABORTED"):
+        """Interrompe il run su Apify e risolve subito il risultato con lo stato `reason`."""
+        if not self._claim(run):
+            return  # Già concluso o già interrotto da un altro thread
+        try:
+            self.client.run(run.run_id).abort()
+        except Exception as e:
+            print(f"      ⚠️ Abort run Apify {run.run_id} fallito: {e}")
+        METRICS.inc("apify_runs_total", status=reason, actor=run.actor_id)
+        run.future.set_result({"id": run.run_id, "status": reason})
+
+    def cancel_all(self):
+        with self._cond:
+            runs = list(self._runs)
+        for run in runs:
+            run.cancel()
+
+    @classmethod
+    def cancel_all_runners(cls):
+        """Annulla i run in corso di tutti i runner del processo (es. SIGTERM del demone)."""
+        for runner in list(cls._instances):
+            runner.cancel_all()
+
+    def _finish(self, run: ApifyRun, info: Dict[str, Any]):
+        if not self._claim(run):
+            return  # Interrotto nel frattempo (abort/cancel): il risultato è già stato risolto
+        METRICS.observe("apify_run_seconds", time.monotonic() - run.started, actor=run.actor_id)
+        METRICS.inc("apify_runs_total", status=info.get("status", "UNKNOWN"), actor=run.actor_id)
+        run.future.set_result(info)
+
+    def _poll_loop(self):
+        while True:
+            with self._cond:
+                if not self._runs:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                due = [r for r in self._runs if r.next_poll <= now]
+                if not due:
+                    self._cond.wait(timeout=min(r.next_poll for r in self._runs) - now)
+                    continue
+
+            for run in due:
+                if run.deadline and time.monotonic() > run.deadline:
+                    print(f"      ⏱️ Run Apify {run.run_id} oltre il timeout: abort")
+                    self.abort(run, "TIMED-OUT")
+                    continue
+                try:
+                    info = self.client.run(run.run_id).get() or {}
+                except Exception as e:
+                    print(f"      ⚠️ Poll run Apify {run.run_id}: {e}")
+                    info = {}
+                if info.get("status") in TERMINAL_STATUSES:
+                    self._finish(run, info)
+                else:
+                    run.interval = min(Config.APIFY_POLL_MAX_SECONDS, run.interval * 1.5)
+                    run.next_poll = time.monotonic() + run.interval
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from core.config import Config
+from core.metrics import METRICS
+
+class ChannelCache:
+    """
+    Cache persistente (SQLite) dei canali YouTube per handle: uploads playlist e titolo
+    (niente channels().list a ogni run), più lo stato dell'ultimo sync LIVE della playlist:
+    ETag della prima pagina, id del video più recente e listing restituito.
+    Con questi YouTubeService invia richieste condizionali (If-None-Match) e smette di
+    paginare appena incontra un video già visto.
+    """
+    def __init__(self, path: Optional[str] = None, ttl_hours: Optional[float] = None):
+        self.path = path or os.path.join(Config.LOCAL_STATE_DIR, "youtube_channels.sqlite")
+        self.ttl_seconds = (ttl_hours if ttl_hours is not None else Config.YOUTUBE_CHANNEL_CACHE_TTL_HOURS) * 3600
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS youtube_channels (
+                handle TEXT PRIMARY KEY,
+                playlist_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                etag TEXT,
+                newest_video_id TEXT,
+                recent TEXT,
+                resolved_at REAL NOT NULL,
+                synced_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        """Voce del canale (playlist_id, title, etag, newest_video_id, recent) o None se assente/scaduta."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT playlist_id, title, etag, newest_video_id, recent, resolved_at FROM youtube_channels WHERE handle = ?",
+                (handle,)
+            ).fetchone()
+        # Scaduta: il canale va risolto di nuovo (es. titolo cambiato), lo stato del sync si perde
+        if row and self.ttl_seconds and time.time() - row[5] > self.ttl_seconds:
+            row = None
+        METRICS.inc("youtube_channel_cache_total", result="hit" if row else "miss")
+        if not row:
+            return None
+        return {
+            "playlist_id": row[0],
+            "title": row[1],
+            "etag": row[2],
+            "newest_video_id": row[3],
+            "recent": json.loads(row[4]) if row[4] else [],
+        }
+
+    def put_channel(self, handle: str, playlist_id: str, title: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO youtube_channels (handle, playlist_id, title, resolved_at) VALUES (?, ?, ?, ?)",
+                (handle, playlist_id, title, time.time())
+            )
+            self._conn.commit()
+
+    def put_sync(self, handle: str, etag: Optional[str], newest_video_id: Optional[str], recent: List[Dict[str, Any]]):
+        """Stato dell'ultimo sync LIVE: ETag della prima pagina, video più recente e listing restituito."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE youtube_channels SET etag = ?, newest_video_id = ?, recent = ?, synced_at = ? WHERE handle = ?",
+                (etag, newest_video_id, json.dumps(recent, ensure_ascii=False), time.time(), handle)
+            )
+            self._conn.commit()
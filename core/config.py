@@ -10,8 +10,99 @@ class Config:
     APIFY_TOKEN: str = os.getenv("APIFY_TOKEN", "")
     
     YOUTUBE_HANDLES: List[str] = ["@Market.Mind.trading", "@InvestireBiz", "@investirebiz-analisi"] #"@InvestireBiz", @investirebiz-analisi
-    MAX_CHARS_AI: int = 150000
+    MAX_CHARS_AI: int = int(os.getenv("MAX_CHARS_AI", "400000"))
+    # Map-reduce trascrizioni lunghe: blocchi sovrapposti analizzati in parallelo
+    AI_CHUNK_CHARS: int = int(os.getenv("AI_CHUNK_CHARS", "40000"))
+    AI_CHUNK_OVERLAP: int = int(os.getenv("AI_CHUNK_OVERLAP", "2000"))
+    AI_CHUNK_WORKERS: int = int(os.getenv("AI_CHUNK_WORKERS", "4"))
+    # Compattazione trascrizioni prima di Gemini; finestra (in parole) attorno alle keyword finanziarie, 0 = testo intero
+    TRANSCRIPT_COMPACTION: bool = os.getenv("TRANSCRIPT_COMPACTION", "1") == "1"
+    TRANSCRIPT_KEYWORD_WINDOW: int = int(os.getenv("TRANSCRIPT_KEYWORD_WINDOW", "0"))
+    # Risposte Gemini in streaming: gli asset sono elaborati man mano che arrivano
+    AI_STREAMING: bool = os.getenv("AI_STREAMING", "1") == "1"
     APIFY_ACTOR_ID: str = "scrape-creators/best-youtube-transcripts-scraper"
+    # Archivio locale compresso delle trascrizioni (consultato prima di Apify)
+    TRANSCRIPT_STORE_ENABLED: bool = os.getenv("TRANSCRIPT_STORE_ENABLED", "1") == "1"
+    TRANSCRIPT_STORE_MAX_MB: int = int(os.getenv("TRANSCRIPT_STORE_MAX_MB", "1024"))
+    TRANSCRIPT_STORE_LEVEL: int = int(os.getenv("TRANSCRIPT_STORE_LEVEL", "9"))
+    # Run Apify non bloccanti: timeout per run e intervallo di polling (backoff esponenziale)
+    APIFY_RUN_TIMEOUT_SECONDS: float = float(os.getenv("APIFY_RUN_TIMEOUT_SECONDS", "900"))
+    APIFY_POLL_MIN_SECONDS: float = float(os.getenv("APIFY_POLL_MIN_SECONDS", "2"))
+    APIFY_POLL_MAX_SECONDS: float = float(os.getenv("APIFY_POLL_MAX_SECONDS", "15"))
+    # Video per singolo run dell'Actor trascrizioni (avvio pagato una volta per lotto)
+    APIFY_BATCH_SIZE: int = int(os.getenv("APIFY_BATCH_SIZE", "25"))
+    # Post Truth Social analizzati in una singola richiesta Gemini
+    TRUMP_BATCH_SIZE: int = int(os.getenv("TRUMP_BATCH_SIZE", "10"))
+    # Blocchi di post Truth analizzati in parallelo (la concorrenza reale verso Gemini resta regolata dall'AIMD)
+    TRUMP_WORKERS: int = int(os.getenv("TRUMP_WORKERS", "4"))
+    # Inizio dello storico Truth Social scaricato in BACKFILL (data ISO) e post massimi per run
+    TRUMP_BACKFILL_START: str = os.getenv("TRUMP_BACKFILL_START", "2026-02-05")
+    TRUMP_BACKFILL_MAX_ITEMS: int = int(os.getenv("TRUMP_BACKFILL_MAX_ITEMS", "500"))
+    # Pre-classificatore locale: salta i post con P(impact_score >= 3) sotto soglia;
+    # una piccola quota dei saltati va comunque a Gemini per misurare la precisione dello skip
+    TRUMP_PRECLASSIFIER_ENABLED: bool = os.getenv("TRUMP_PRECLASSIFIER_ENABLED", "1") == "1"
+    TRUMP_PRECLASSIFIER_THRESHOLD: float = float(os.getenv("TRUMP_PRECLASSIFIER_THRESHOLD", "0.15"))
+    TRUMP_PRECLASSIFIER_AUDIT_RATE: float = float(os.getenv("TRUMP_PRECLASSIFIER_AUDIT_RATE", "0.05"))
+
+    # --- CONCORRENZA & QUOTE ---
+    # Richieste al minuto consentite (token bucket condiviso tra thread)
+    GEMINI_RPM: int = int(os.getenv("GEMINI_RPM", "10"))
+    APIFY_RPM: int = int(os.getenv("APIFY_RPM", "30"))
+    # Controller AIMD Gemini: concorrenza iniziale/massima e backoff base dopo un 429
+    GEMINI_AIMD_INITIAL: float = float(os.getenv("GEMINI_AIMD_INITIAL", "2"))
+    GEMINI_AIMD_MAX: float = float(os.getenv("GEMINI_AIMD_MAX", "16"))
+    GEMINI_AIMD_BACKOFF_SECONDS: float = float(os.getenv("GEMINI_AIMD_BACKOFF_SECONDS", "5"))
+    # Budget giornaliero token Gemini (0 = nessun limite); il backfill si ferma alla quota "bassa priorità"
+    GEMINI_DAILY_TOKEN_BUDGET: int = int(os.getenv("GEMINI_DAILY_TOKEN_BUDGET", "0"))
+    LOW_PRIORITY_BUDGET_SHARE: float = float(os.getenv("LOW_PRIORITY_BUDGET_SHARE", "0.8"))
+    CHARS_PER_TOKEN: float = float(os.getenv("CHARS_PER_TOKEN", "4"))
+    # Worker per stadio della pipeline YouTube e capienza delle code tra stadi
+    FETCH_WORKERS: int = int(os.getenv("FETCH_WORKERS", "3"))
+    TRANSCRIPT_WORKERS: int = int(os.getenv("TRANSCRIPT_WORKERS", "4"))
+    AI_WORKERS: int = int(os.getenv("AI_WORKERS", "2"))
+    PERSIST_WORKERS: int = int(os.getenv("PERSIST_WORKERS", "1"))
+    PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+    # --- MODALITÀ DAEMON (poll incrementali) ---
+    TRUMP_POLL_SECONDS: int = int(os.getenv("TRUMP_POLL_SECONDS", "60"))
+    YOUTUBE_POLL_SECONDS: int = int(os.getenv("YOUTUBE_POLL_SECONDS", "900"))
+    # Range del BACKFILL YouTube (date ISO) e piano a shard per data condiviso tra processi worker
+    YOUTUBE_BACKFILL_START: str = os.getenv("YOUTUBE_BACKFILL_START", "2026-02-09")
+    YOUTUBE_BACKFILL_END: str = os.getenv("YOUTUBE_BACKFILL_END", "2026-02-15")
+    BACKFILL_SHARD_DAYS: int = int(os.getenv("BACKFILL_SHARD_DAYS", "1"))
+    BACKFILL_SHARD_LEASE_SECONDS: float = float(os.getenv("BACKFILL_SHARD_LEASE_SECONDS", "3600"))
+    # Validità della cache canali (uploads playlist, titolo) prima di una nuova channels().list
+    YOUTUBE_CHANNEL_CACHE_TTL_HOURS: float = float(os.getenv("YOUTUBE_CHANNEL_CACHE_TTL_HOURS", "168"))
+    DAEMON_POLL_OVERLAP_SECONDS: int = int(os.getenv("DAEMON_POLL_OVERLAP_SECONDS", "120"))
+
+    # --- STATO LOCALE DEL WORKER (ledger, cache) ---
+    LOCAL_STATE_DIR: str = os.getenv("LOCAL_STATE_DIR", ".worker_state")
+
+    # --- CACHE RISPOSTE AI (SQLite, LRU per dimensione + TTL) ---
+    AI_CACHE_ENABLED: bool = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+    AI_CACHE_MAX_MB: int = int(os.getenv("AI_CACHE_MAX_MB", "256"))
+    AI_CACHE_TTL_DAYS: float = float(os.getenv("AI_CACHE_TTL_DAYS", "30"))
+
+    # --- NEAR-DUPLICATE (SimHash su post e trascrizioni già analizzati) ---
+    NEAR_DUP_ENABLED: bool = os.getenv("NEAR_DUP_ENABLED", "1") == "1"
+    NEAR_DUP_MAX_DISTANCE: int = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3"))  # bit diversi su 64
+    NEAR_DUP_MIN_WORDS: int = int(os.getenv("NEAR_DUP_MIN_WORDS", "12"))
+
+    # --- METRICHE ---
+    # Snapshot JSON scritto a fine run / a ogni ciclo del demone; porta HTTP Prometheus (0 = disattivata)
+    METRICS_SNAPSHOT_PATH: str = os.getenv("METRICS_SNAPSHOT_PATH", os.path.join(LOCAL_STATE_DIR, "metrics.json"))
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+
+    # --- MODALITÀ REPLAY (benchmark offline con fake) ---
+    REPLAY_FIXTURES: str = os.getenv("REPLAY_FIXTURES", "")  # JSON registrato; vuoto = fixture sintetica
+    REPLAY_BASE_MODE: str = os.getenv("REPLAY_BASE_MODE", "BACKFILL")
+    REPLAY_LATENCY_MS: str = os.getenv("REPLAY_LATENCY_MS", "youtube=150,apify=2000,gemini=1500,db=40")
+    REPLAY_ERROR_RATE: float = float(os.getenv("REPLAY_ERROR_RATE", "0.0"))
+    REPLAY_429_RATE: float = float(os.getenv("REPLAY_429_RATE", "0.0"))
+    REPLAY_BACKOFF_SECONDS: float = float(os.getenv("REPLAY_BACKOFF_SECONDS", "0.5"))
+    REPLAY_SEED: int = int(os.getenv("REPLAY_SEED", "42"))
+    REPLAY_SYNTHETIC_VIDEOS: int = int(os.getenv("REPLAY_SYNTHETIC_VIDEOS", "5"))
+    REPLAY_SYNTHETIC_POSTS: int = int(os.getenv("REPLAY_SYNTHETIC_POSTS", "20"))
 
     @classmethod
     def validate(cls):
@@ -0,0 +1,127 @@
+import re
+import time
+from html.entities import html5
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Un solo scanner per tag, commenti, doctype e blocchi script/style (attributi tra virgolette
+# possono contenere '>'). Il testo tra un match e il successivo è un nodo di testo.
+_MARKUP_RE = re.compile(
+    r"<(?:"
+    r"!--.*?(?:-->|$)"                                   # commento (anche non chiuso)
+    r"|script\b(?:[^>\"']|\"[^\"]*\"|'[^']*')*>.*?(?:</script\s*>|$)"  # contenuto non testuale
+    r"|style\b(?:[^>\"']|\"[^\"]*\"|'[^']*')*>.*?(?:</style\s*>|$)"
+    r"|/?[a-zA-Z][^\s/>]*(?:[^>\"']|\"[^\"]*\"|'[^']*')*>"  # tag di apertura/chiusura
+    r"|/[^>]*>"                                           # chiusura malformata
+    r"|[!?][^>]*>"                                        # doctype / processing instruction
+    r")",
+    re.DOTALL | re.IGNORECASE,
+)
+
+# Riferimenti a entità come li riconosce html.parser: nome/numero seguito da ';' (consumato) o da un
+# carattere che non può continuarlo. Un riferimento senza ';' in coda all'input resta testo letterale,
+# mentre in coda a un nodo seguito da un tag ('<' lo termina) viene decodificato.
+def _entity_re(at_end: str) -> "re.Pattern":
+    return re.compile(
+        r"&(?:(#[0-9]+|#[xX][0-9a-fA-F]+)(?:;|(?=[^0-9a-fA-F])" + at_end + r")"
+        r"|([a-zA-Z][-.a-zA-Z0-9]*)(?:;|(?=[^a-zA-Z0-9])" + at_end + r"))"
+    )
+
+_ENTITY_RE = _entity_re(r"|$")
+_ENTITY_FINAL_RE = _entity_re("")
+# Markup malformato che html.parser tratta in modi particolari (mai visto nei post reali, dove '<' e '&'
+# sono sempre escapati): '&#' non valido, '<' fuori da un tag, entità troncata a fine input.
+# In questi casi si usa BeautifulSoup, così l'output resta identico.
+_MALFORMED_CHARREF_RE = re.compile(r"&#(?![0-9]+(?:[^0-9a-fA-F]|$)|[xX][0-9a-fA-F]+(?:[^0-9a-fA-F]|$))")
+_ENTITY_TAIL_RE = re.compile(r"&#?[a-zA-Z0-9][-.a-zA-Z0-9]*$")
+_ASCII_SPACES = " \n\t\x0c\r"
+
+def _decode_entity(match: "re.Match") -> str:
+    name = match.group(1) or match.group(2)
+    if name[0] != "#":
+        # Nome sconosciuto: come BeautifulSoup, testo letterale senza il ';'
+        return html5.get(name + ";", "&" + name)
+    code = int(name[2:], 16) if name[1] in "xX" else int(name[1:])
+    if code < 256:
+        # Riferimenti 128-159 interpretati come windows-1252 (es. &#146; -> ’)
+        try:
+            return bytes([code]).decode("windows-1252")
+        except UnicodeDecodeError:
+            pass
+    try:
+        return chr(code)
+    except (ValueError, OverflowError):
+        return "\N{REPLACEMENT CHARACTER}"
+
+def _unescape(text: str, final: bool) -> str:
+    """Entità decodificate; un riferimento in coda all'ultimo nodo di testo resta letterale."""
+    if "&" not in text:
+        return text
+    pattern = _ENTITY_FINAL_RE if final else _ENTITY_RE
+    return pattern.sub(_decode_entity, text)
+
+def _reference(raw_html: str) -> str:
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(raw_html, "html.parser").get_text(separator=" ").strip()
+
+def html_to_text(raw_html: Optional[str]) -> str:
+    """
+    Testo di un post Truth Social (p, br, a, span, entità) con lo stesso risultato di
+    BeautifulSoup(raw_html, "html.parser").get_text(separator=" ").strip(), senza costruire l'albero:
+    i nodi di testo tra un tag e l'altro sono uniti da uno spazio, le entità decodificate.
+    """
+    if not raw_html:
+        return ""
+    if "&#" in raw_html and _MALFORMED_CHARREF_RE.search(raw_html):
+        return _reference(raw_html)
+    # Nodi di testo tra i tag (split senza gruppi: nessun separatore nel risultato, '' tra tag adiacenti)
+    parts = _MARKUP_RE.split(raw_html)
+    tail = parts[-1]
+    if tail and _ENTITY_TAIL_RE.search(tail):
+        return _reference(raw_html)
+
+    texts = []
+    last = len(parts) - 1
+    for i, part in enumerate(parts):
+        if not part:
+            continue
+        if "<" in part:
+            # '<' non seguito da un tag valido (testo non escapato, tag troncato): caso limite di html.parser
+            return _reference(raw_html)
+        part = _unescape(part, i == last)
+        if not part.strip(_ASCII_SPACES):
+            # Come BeautifulSoup: un nodo di soli spazi diventa "\n" (se ne contiene) o " "
+            part = "\n" if "\n" in part else " "
+        texts.append(part)
+    return " ".join(texts).strip()
+
+def html_to_text_batch(raw_htmls: Iterable[Optional[str]]) -> List[str]:
+    """Pulizia di una lista di post in un solo passaggio (stesso ordine dell'input)."""
+    return [html_to_text(raw) for raw in raw_htmls]
+
+def benchmark(samples: Sequence[str], repeat: int = 3) -> Dict[str, float]:
+    """
+    Confronta html_to_text con BeautifulSoup sugli stessi post: output diversi e post/s
+    di entrambe le implementazioni (miglior tempo su `repeat` passaggi).
+    """
+    def best(fn) -> float:
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - t0)
+        return min(timings) or 1e-9
+
+    reference = [_reference(s) if s else "" for s in samples]
+    fast = html_to_text_batch(samples)
+    mismatches = [i for i, (a, b) in enumerate(zip(reference, fast)) if a != b]
+
+    bs4_seconds = best(lambda: [_reference(s) for s in samples if s])
+    fast_seconds = best(lambda: html_to_text_batch(samples))
+    return {
+        "posts": len(samples),
+        "mismatches": len(mismatches),
+        "first_mismatch": mismatches[0] if mismatches else -1,
+        "bs4_posts_per_sec": round(len(samples) / bs4_seconds, 1),
+        "fast_posts_per_sec": round(len(samples) / fast_seconds, 1),
+        "speedup": round(bs4_seconds / fast_seconds, 1),
+    }
@@ -0,0 +1,97 @@
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+class StreamingArrayParser:
+    """
+    Parser incrementale per risposte JSON in streaming: estrae gli oggetti completi
+    dell'array `key` dell'oggetto radice (es. "assets") man mano che arrivano i chunk.
+    Scansione carattere per carattere con stato (profondità, stringhe, escape) conservato
+    tra un feed e l'altro: ogni carattere è letto una sola volta.
+    """
+    def __init__(self, key: str = "assets"):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._array_closed = False
+        self._object_start: Optional[int] = None
+        self.items: List[Dict[str, Any]] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Aggiunge un chunk e restituisce gli oggetti dell'array completati in questo chunk."""
+        self.text += chunk or ""
+        text = self.text
+        completed = []
+        while self._pos < len(text):
+            c = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:self._pos]
+            elif c == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif c in "{[":
+                if (c == "[" and self._depth == 1 and self._last_key == self.key
+                        and self._array_depth is None and not self._array_closed):
+                    self._array_depth = self._depth + 1
+                self._depth += 1
+                if c == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._object_start = self._pos
+            elif c in "}]":
+                if c == "}" and self._object_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        obj = json.loads(text[self._object_start:self._pos + 1])
+                        if isinstance(obj, dict):
+                            completed.append(obj)
+                    except ValueError:
+                        pass
+                    self._object_start = None
+                elif c == "]" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._array_depth = None
+                    self._array_closed = True
+                self._depth -= 1
+            self._pos += 1
+
+        self.items.extend(completed)
+        return completed
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        # Pulizia nel caso Gemini inserisca markdown
+        return text.replace("```json", "").replace("```", "").strip()
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Oggetto completo se il JSON è valido, altrimenti None (stream troncato)."""
+        try:
+            parsed = json.loads(self._clean(self.text))
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    def recover(self, *fields: str) -> Dict[str, Any]:
+        """
+        Recupero di uno stream troncato: i campi stringa di primo livello già ricevuti
+        più gli oggetti dell'array che sono stati chiusi per intero.
+        """
+        recovered: Dict[str, Any] = {}
+        for field in fields:
+            match = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % re.escape(field), self.text)
+            if match:
+                try:
+                    recovered[field] = json.loads(f'"{match.group(1)}"')
+                except ValueError:
+                    continue
+        recovered[self.key] = list(self.items)
+        return recovered
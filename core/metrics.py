@@ -0,0 +1,169 @@
+import os
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from core.config import Config
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(labels) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Histogram:
+    """Durate osservate (finestra mobile delle ultime `window` misure) con count/sum cumulativi."""
+    def __init__(self, window: int = 5000):
+        self.samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[idx]
+
+class MetricsRegistry:
+    """
+    Registro metriche di processo (thread-safe): durate per stadio con p50/p95/p99
+    e contatori (chiamate, errori, 429, retry). Esportabile in formato Prometheus o JSON.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, Histogram] = {}
+        self._gauges: Dict[tuple, float] = {}
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._histograms.setdefault(key, Histogram()).observe(value)
+
+    def total(self, name: str) -> float:
+        """Somma di un contatore su tutte le combinazioni di label."""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    @contextmanager
+    def time_stage(self, stage: str, **labels):
+        """Cronometra uno stadio: durata in `stage_duration_seconds`, esito in `stage_calls_total`."""
+        t0 = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - t0, stage=stage, **labels)
+            self.inc("stage_calls_total", stage=stage, outcome=outcome, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._counters.items()]
+            gauges = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._gauges.items()]
+            histograms = []
+            for (n, l), h in self._histograms.items():
+                entry = {"name": n, "labels": dict(l), "count": h.count, "sum": round(h.total, 6)}
+                for q in QUANTILES:
+                    entry[f"p{int(q * 100)}"] = round(h.quantile(q), 6)
+                histograms.append(entry)
+        return {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self) -> str:
+        """Formato testo Prometheus (istogrammi esposti come summary con quantili)."""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_fmt_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} gauge")
+                    typed.add(name)
+                lines.append(f"{name}{_fmt_labels(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} summary")
+                    typed.add(name)
+                for q in QUANTILES:
+                    lines.append(f"{name}{_fmt_labels(labels, {'quantile': str(q)})} {h.quantile(q):.6f}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {h.total:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: Optional[str] = None) -> str:
+        """Scrive lo snapshot JSON (file atomico) e restituisce il percorso."""
+        path = path or Config.METRICS_SNAPSHOT_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+        print(f"📈 Metriche salvate in {path}")
+        return path
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        """Espone /metrics (Prometheus) e /metrics.json su un thread in background."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, ctype = json.dumps(registry.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, ctype = registry.to_prometheus().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📈 Metriche esposte su http://0.0.0.0:{port}/metrics")
+        return server
+
+# Registro condiviso da servizi, repository e orchestratore
+METRICS = MetricsRegistry()
@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+from core.config import Config
+from core.metrics import METRICS
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+def simhash(text: str, shingle: Optional[int] = None) -> Optional[int]:
+    """
+    SimHash a 64 bit su shingle di parole (testo minuscolo, punteggiatura ignorata).
+    Di default parole singole per i testi brevi (post: una parola cambiata sposterebbe troppi
+    trigrammi) e trigrammi per quelli lunghi (trascrizioni: conta anche l'ordine).
+    None se il testo è troppo corto per un'impronta affidabile.
+    """
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < Config.NEAR_DUP_MIN_WORDS:
+        return None
+    shingle = shingle or (1 if len(words) < 200 else 3)
+    hashes = [_hash64(" ".join(words[i:i + shingle])) for i in range(max(1, len(words) - shingle + 1))]
+    # Conteggio per (posizione byte, valore byte): poche migliaia di somme invece di 64 per shingle
+    byte_counts = Counter(chain.from_iterable(enumerate(h.to_bytes(8, "little")) for h in hashes))
+    ones = [0] * 64
+    for (position, value), n in byte_counts.items():
+        for bit in range(8):
+            if (value >> bit) & 1:
+                ones[position * 8 + bit] += n
+    half = len(hashes) / 2
+    return sum(1 << bit for bit in range(64) if ones[bit] > half)
+
+class NearDuplicateIndex:
+    """
+    Indice locale dei contenuti già analizzati (post Truth, trascrizioni) per impronta SimHash.
+    Due contenuti sono near-duplicate se le impronte differiscono al massimo di
+    Config.NEAR_DUP_MAX_DISTANCE bit. L'impronta è divisa in (distanza + 1) bande: per il
+    principio dei cassetti un near-duplicate condivide almeno una banda identica, quindi
+    la ricerca è qualche lookup in dizionario più pochi confronti di Hamming, non una scansione.
+    Persistito in SQLite (con l'analisi da riutilizzare) e ricaricato in memoria all'avvio.
+    """
+    def __init__(self, path: Optional[str] = None, max_distance: Optional[int] = None):
+        self.path = path or os.path.join(Config.LOCAL_STATE_DIR, "near_dup_index.sqlite")
+        self.max_distance = Config.NEAR_DUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.bands = self.max_distance + 1
+        self.band_bits = 64 // self.bands
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS near_dup_index (
+                item_key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                analysis TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        # (fonte, banda, valore) -> [(impronta, chiave)]
+        self._buckets: Dict[Tuple[str, int, int], List[Tuple[int, str]]] = {}
+        self._size = 0
+        for key, source, fingerprint in self._conn.execute("SELECT item_key, source, fingerprint FROM near_dup_index"):
+            self._insert(key, source, int(fingerprint))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _band_keys(self, source: str, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield source, band, (fingerprint >> (band * self.band_bits)) & mask
+
+    def _insert(self, key: str, source: str, fingerprint: int):
+        for band_key in self._band_keys(source, fingerprint):
+            self._buckets.setdefault(band_key, []).append((fingerprint, key))
+        self._size += 1
+
+    def find(self, text: str, source: str) -> Optional[Tuple[str, Any]]:
+        """(chiave dell'item originale, analisi salvata) del near-duplicate più vicino, o None."""
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None
+        t0 = time.perf_counter()
+        best: Optional[Tuple[int, str]] = None
+        with self._lock:
+            for band_key in self._band_keys(source, fingerprint):
+                for candidate, key in self._buckets.get(band_key, ()):
+                    distance = bin(candidate ^ fingerprint).count("1")
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, key)
+            METRICS.observe("near_dup_lookup_seconds", time.perf_counter() - t0, source=source)
+            if best is None:
+                METRICS.inc("near_dup_total", result="miss", source=source)
+                return None
+            row = self._conn.execute("SELECT analysis FROM near_dup_index WHERE item_key = ?", (best[1],)).fetchone()
+
+        METRICS.inc("near_dup_total", result="hit", source=source)
+        analysis = json.loads(row[0]) if row and row[0] else None
+        return best[1], analysis
+
+    def add(self, key: str, text: str, source: str, analysis: Any = None):
+        """Registra un contenuto analizzato (con l'analisi da riutilizzare per i suoi duplicati)."""
+        fingerprint = simhash(text)
+        if fingerprint is None or not key:
+            return
+        data = json.dumps(analysis, ensure_ascii=False) if analysis is not None else None
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM near_dup_index WHERE item_key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO near_dup_index (item_key, source, fingerprint, analysis, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, source, str(fingerprint), data, time.time())
+            )
+            self._conn.commit()
+            if not exists:
+                self._insert(key, source, fingerprint)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM near_dup_index")
+            self._conn.commit()
+            self._buckets.clear()
+            self._size = 0
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import random
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from core.config import Config
+
+# --- FILTRO JUNK (una sola regex compilata, una sola scansione del testo) ---
+# Endorsement politici, retweet e auguri: mai rilevanti per i mercati
+JUNK_KEYWORDS = [
+    "endorse", "endorsement", "honor to endorse", "congressman",
+    "governor", "senator", "maga warrior", "america first patriot",
+    "complete and total endorsement", "retruth", "happy birthday"
+]
+_JUNK_RE = re.compile(r"rt\s+@|" + "|".join(re.escape(k) for k in JUNK_KEYWORDS), re.IGNORECASE)
+_THANKS_RE = re.compile(r"thank you", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"[a-z0-9$%']+")
+
+def is_junk(text: str) -> bool:
+    """Stesse regole del vecchio filtro a lista, senza lowercase né scansioni ripetute."""
+    if not text:
+        return False
+    if _JUNK_RE.search(text):
+        return True
+    # Regole condizionate alla lunghezza: controllate solo sui testi corti
+    if len(text) < 50 and _THANKS_RE.search(text):
+        return True
+    if len(text) < 100 and text[:4].lower() == "http":
+        return True
+    return False
+
+class ImpactPreClassifier:
+    """
+    Modello locale (regressione logistica su n-grammi di parole hashati) che stima
+    P(impact_score >= 3) di un post già pulito. Addestrato sullo storico degli
+    impact_score assegnati da Gemini; i post con probabilità sotto soglia non
+    vengono inviati al modello. Pesi sparsi in JSON sotto Config.LOCAL_STATE_DIR.
+    """
+    HIGH_IMPACT = 3
+
+    def __init__(self, weights: Optional[Dict[int, float]] = None, bias: float = 0.0, bits: int = 18,
+                 meta: Optional[Dict] = None):
+        self.weights: Dict[int, float] = weights or {}
+        self.bias = bias
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.meta = meta or {}
+
+    @staticmethod
+    def default_path() -> str:
+        return os.path.join(Config.LOCAL_STATE_DIR, "truth_preclassifier.json")
+
+    def features(self, text: str) -> List[int]:
+        """Unigrammi + bigrammi, hashati (crc32 deterministico tra processi) e senza ripetizioni."""
+        tokens = _TOKEN_RE.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return list({zlib.crc32(g.encode("utf-8")) & self.mask for g in grams})
+
+    def _score(self, feats: Sequence[int]) -> float:
+        z = self.bias + sum(self.weights.get(f, 0.0) for f in feats)
+        z = max(-30.0, min(30.0, z))
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def probability(self, text: str) -> float:
+        """Probabilità stimata che il post abbia impact_score >= 3."""
+        return self._score(self.features(text))
+
+    @classmethod
+    def train(cls, samples: Sequence[Tuple[str, int]], epochs: int = 8, lr: float = 0.2,
+              l2: float = 1e-5, bits: int = 18, seed: int = 42) -> "ImpactPreClassifier":
+        """SGD sulla log-loss; le classi sono ribilanciate (i post rilevanti sono la minoranza)."""
+        model = cls(bits=bits)
+        data = [(model.features(text), 1.0 if score >= cls.HIGH_IMPACT else 0.0) for text, score in samples]
+        positives = sum(y for _, y in data) or 1.0
+        negatives = (len(data) - positives) or 1.0
+        class_weight = {1.0: len(data) / (2 * positives), 0.0: len(data) / (2 * negatives)}
+
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1 + epoch)
+            for feats, y in data:
+                grad = (model._score(feats) - y) * class_weight[y]
+                model.bias -= step * grad
+                for f in feats:
+                    w = model.weights.get(f, 0.0)
+                    model.weights[f] = w - step * (grad + l2 * w)
+        model.meta = {
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "samples": len(data),
+            "positives": int(positives),
+        }
+        return model
+
+    def evaluate(self, samples: Sequence[Tuple[str, int]], threshold: float) -> Dict[str, float]:
+        """
+        Metriche del filtro a soglia: quanti post verrebbero saltati, la precisione dello skip
+        (quota di saltati con score reale 0-2), i rilevanti persi e il throughput in post/s.
+        """
+        t0 = time.perf_counter()
+        predictions = [(self.probability(text) < threshold, score) for text, score in samples]
+        elapsed = time.perf_counter() - t0
+
+        skipped = [score for skip, score in predictions if skip]
+        correct = sum(1 for score in skipped if score < self.HIGH_IMPACT)
+        high_total = sum(1 for _, score in predictions if score >= self.HIGH_IMPACT)
+        return {
+            "posts": len(predictions),
+            "skipped": len(skipped),
+            "skip_rate": round(len(skipped) / len(predictions), 4) if predictions else 0.0,
+            "skip_precision": round(correct / len(skipped), 4) if skipped else 1.0,
+            "missed_high_impact": len(skipped) - correct,
+            "high_impact_recall": round(1 - (len(skipped) - correct) / high_total, 4) if high_total else 1.0,
+            "posts_per_sec": round(len(predictions) / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or self.default_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "bits": self.bits,
+                "bias": self.bias,
+                "meta": self.meta,
+                # Pesi trascurabili esclusi: file piccolo, stessa accuratezza
+                "weights": {str(k): round(v, 5) for k, v in self.weights.items() if abs(v) > 1e-4},
+            }, f)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> Optional["ImpactPreClassifier"]:
+        """Modello salvato, o None se non ancora addestrato (in quel caso resta solo il filtro junk)."""
+        path = path or cls.default_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            weights = {int(k): float(v) for k, v in data.get("weights", {}).items()}
+            return cls(weights, float(data.get("bias", 0.0)), int(data.get("bits", 18)), data.get("meta"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Pre-classificatore Truth non leggibile ({path}): {e}")
+            return None
+
+def train_and_report(samples: Sequence[Tuple[str, int]], threshold: Optional[float] = None,
+                     holdout: float = 0.2, seed: int = 42) -> Optional[ImpactPreClassifier]:
+    """Addestra sullo storico, stampa le metriche sul campione di validazione e salva il modello finale."""
+    threshold = Config.TRUMP_PRECLASSIFIER_THRESHOLD if threshold is None else threshold
+    samples = [(text, int(score)) for text, score in samples if text]
+    if len(samples) < 20:
+        print(f"⚠️ Storico Truth insufficiente per l'addestramento ({len(samples)} post)")
+        return None
+
+    shuffled = list(samples)
+    random.Random(seed).shuffle(shuffled)
+    cut = max(1, int(len(shuffled) * holdout))
+    validation, training = shuffled[:cut], shuffled[cut:]
+
+    report = ImpactPreClassifier.train(training).evaluate(validation, threshold)
+    print(f"🔮 Validazione ({len(validation)} post, soglia {threshold}): {report}")
+
+    model = ImpactPreClassifier.train(samples)
+    model.meta["validation"] = report
+    model.meta["threshold"] = threshold
+    print(f"🔮 Modello salvato in {model.save()} ({len(model.weights)} pesi)")
+    return model
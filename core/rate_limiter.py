@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from core.config import Config
+from core.metrics import METRICS
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """429 / RESOURCE_EXHAUSTED, qualunque sia la libreria che lo solleva."""
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe per rispettare le quote delle API esterne.
+    Si ricarica di `rate_per_minute` token al minuto, con burst massimo `capacity`.
+    """
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, name: str = ""):
+        self.name = name
+        self.rate_per_sec = max(float(rate_per_minute), 0.001) / 60.0
+        self.capacity = float(capacity) if capacity else max(1.0, float(rate_per_minute))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate_per_sec)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Blocca finché non ci sono `tokens` disponibili.
+        Restituisce False solo se scade il `timeout` (None = attesa illimitata).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate_per_sec
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class AIMDController:
+    """
+    Controllo adattivo della concorrenza (Additive Increase / Multiplicative Decrease),
+    condiviso da tutti i servizi che chiamano la stessa API.
+    - Ogni risposta OK allarga il limite di ~1 permesso per "finestra" (+increase/limite).
+    - Ogni 429 lo moltiplica per `decrease` e impone una pausa esponenziale con jitter
+      a TUTTI i chiamanti, così i servizi non martellano la quota insieme per poi bloccarsi insieme.
+    Il token bucket resta il tetto rigido (RPM); questo controller tiene il throughput appena sotto la quota reale.
+    """
+    def __init__(self, name: str, bucket: TokenBucket, initial: float = 2.0, minimum: float = 1.0,
+                 maximum: float = 16.0, increase: float = 1.0, decrease: float = 0.5,
+                 base_backoff: float = 5.0, max_backoff: float = 120.0):
+        self.name = name
+        self.bucket = bucket
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self._consecutive_429 = 0
+        self._backoff_until = 0.0
+        self._latency_ewma = 0.0
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self):
+        METRICS.set_gauge("aimd_concurrency_limit", self.limit, service=self.name)
+        METRICS.set_gauge("aimd_allowed_rpm", self.allowed_rate(), service=self.name)
+
+    def allowed_rate(self) -> float:
+        """Richieste/minuto consentite ora: min(concorrenza / latenza media, tetto del bucket)."""
+        ceiling = self.bucket.rate_per_sec * 60
+        if not self._latency_ewma:
+            return ceiling
+        return min(ceiling, int(self.limit) * 60.0 / self._latency_ewma)
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                wait = self._backoff_until - time.monotonic()
+                if wait <= 0 and self.in_flight < max(1, int(self.limit)):
+                    self.in_flight += 1
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+        # Tetto rigido della quota (RPM), fuori dal lock per non bloccare gli altri
+        self.bucket.acquire()
+
+    def _release(self, elapsed: float, outcome: str):
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self._consecutive_429 = 0
+                self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1.0))
+                self._latency_ewma = elapsed if not self._latency_ewma else 0.8 * self._latency_ewma + 0.2 * elapsed
+            elif outcome == "rate_limited":
+                self._consecutive_429 += 1
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                # Backoff esponenziale con "full jitter": i thread non ripartono tutti nello stesso istante
+                cap = min(self.max_backoff, self.base_backoff * (2 ** (self._consecutive_429 - 1)))
+                pause = random.uniform(cap / 2, cap)
+                self._backoff_until = max(self._backoff_until, time.monotonic() + pause)
+                print(f"   🚦 [{self.name}] 429: concorrenza -> {self.limit:.1f}, pausa condivisa {pause:.0f}s")
+            self._publish()
+            self._cond.notify_all()
+
+    @contextmanager
+    def permit(self):
+        """
+        Permesso per una chiamata: attende slot + backoff + token, poi registra l'esito.
+        Le eccezioni vengono rilanciate; i 429 riducono il limite per tutti i servizi.
+        """
+        self._acquire()
+        t0 = time.monotonic()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException as e:
+            outcome = "rate_limited" if is_rate_limit_error(e) else "error"
+            raise
+        finally:
+            self._release(time.monotonic() - t0, outcome)
+
+# Bucket condivisi a livello di processo (tutti i thread e tutti i servizi)
+GEMINI_LIMITER = TokenBucket(Config.GEMINI_RPM, name="gemini")
+APIFY_LIMITER = TokenBucket(Config.APIFY_RPM, name="apify")
+
+# Controller adattivo unico per Gemini: AIService e TrumpWatchService prendono permessi da qui
+GEMINI_AIMD = AIMDController(
+    "gemini", GEMINI_LIMITER,
+    initial=Config.GEMINI_AIMD_INITIAL, maximum=Config.GEMINI_AIMD_MAX,
+    base_backoff=Config.GEMINI_AIMD_BACKOFF_SECONDS
+)
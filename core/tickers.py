@@ -0,0 +1,16 @@
+# Mappa di normalizzazione storica (alias usati da AI/canali -> ticker della tabella 'assets')
+TICKER_FIX = {
+    "NQ": "NQ100", "NAS100": "NQ100", "NASDAQ": "NQ100", "NAS": "NQ100",
+    "ES": "SPX500", "US500": "SPX500", "S&P500": "SPX500", "SPX": "SPX500",
+    "DOW": "DJ30", "US30": "DJ30", "YM": "DJ30",
+    "EU": "EURUSD", "GU": "GBPUSD", "UJ": "USDJPY", "UC": "USDCHF",
+    "GOLD": "XAUUSD", "ORO": "XAUUSD", "SILVER": "XAGUSD", "ARGENTO": "XAGUSD",
+    "OIL": "WTI", "PETROLIO": "WTI", "BRENT": "BRENT",
+    "BTC": "BTCUSD", "ETH": "ETHUSD", "SOL": "SOLUSD",
+    "US10Y": "US10Y", "DXY": "DXY", "DOLLARO": "DXY"
+}
+
+def normalize_ticker(raw) -> str:
+    """Ticker maiuscolo, senza spazi, con gli alias mappati sul ticker standard."""
+    ticker = str(raw or "UNKNOWN").upper().strip()
+    return TICKER_FIX.get(ticker, ticker)
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+from core.config import Config
+from core.metrics import METRICS
+
+class QuotaExceededError(Exception):
+    """Budget giornaliero di token esaurito per il lavoro richiesto: l'item va rinviato, non scartato."""
+
+class TokenLedger:
+    """
+    Registro persistente (SQLite) dei token Gemini per giorno (UTC), modello e sorgente.
+    Ogni prompt viene stimato PRIMA dell'invio; a risposta ricevuta si registra l'usage reale.
+    Con Config.GEMINI_DAILY_TOKEN_BUDGET > 0 il lavoro a bassa priorità (backfill) si ferma
+    a Config.LOW_PRIORITY_BUDGET_SHARE del budget, lasciando margine al LIVE.
+    """
+    def __init__(self, path: Optional[str] = None, daily_budget: Optional[int] = None):
+        self.path = path or os.path.join(Config.LOCAL_STATE_DIR, "token_ledger.sqlite")
+        self.daily_budget = daily_budget if daily_budget is not None else Config.GEMINI_DAILY_TOKEN_BUDGET
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS token_ledger (
+                day TEXT NOT NULL,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                estimated_tokens INTEGER NOT NULL DEFAULT 0,
+                actual_tokens INTEGER NOT NULL DEFAULT 0,
+                insights INTEGER NOT NULL DEFAULT 0,
+                accounted_tokens INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, model, source)
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(token_ledger)")}
+        if "accounted_tokens" not in columns:
+            # Ledger creato prima della colonna: le righe esistenti tengono il conteggio aggregato precedente
+            try:
+                self._conn.execute("ALTER TABLE token_ledger ADD COLUMN accounted_tokens INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute(
+                    "UPDATE token_ledger SET accounted_tokens = "
+                    "CASE WHEN actual_tokens > 0 THEN actual_tokens ELSE estimated_tokens END"
+                )
+            except sqlite3.OperationalError:
+                pass  # Colonna aggiunta nel frattempo da un altro processo
+        self._conn.commit()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        """Stima pre-flight dei token di input (~Config.CHARS_PER_TOKEN caratteri per token)."""
+        return int(len(text or "") / max(Config.CHARS_PER_TOKEN, 0.1)) + 1
+
+    def _upsert(self, model: str, source: str, calls: int = 0, estimated: int = 0, actual: int = 0, insights: int = 0,
+                accounted: int = 0):
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO token_ledger (day, model, source, calls, estimated_tokens, actual_tokens, insights, accounted_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(day, model, source) DO UPDATE SET
+                    calls = calls + excluded.calls,
+                    estimated_tokens = estimated_tokens + excluded.estimated_tokens,
+                    actual_tokens = actual_tokens + excluded.actual_tokens,
+                    insights = insights + excluded.insights,
+                    accounted_tokens = accounted_tokens + excluded.accounted_tokens
+            """, (self._today(), model, source, calls, estimated, actual, insights, accounted))
+            self._conn.commit()
+
+    def record(self, model: str, source: str, estimated: int, actual: Optional[int] = None):
+        """
+        Registra una chiamata: stima pre-flight e, se il modello la riporta, l'usage reale.
+        Il budget conta, per ogni chiamata, l'usage reale se noto altrimenti la stima.
+        """
+        self._upsert(model, source, calls=1, estimated=estimated, actual=actual or 0, accounted=actual or estimated)
+        METRICS.inc("gemini_tokens_total", estimated, kind="estimated", source=source)
+        if actual:
+            METRICS.inc("gemini_tokens_total", actual, kind="actual", source=source)
+
+    def add_insights(self, model: str, source: str, count: int):
+        if count:
+            self._upsert(model, source, insights=count)
+
+    def used_today(self) -> int:
+        """Token consumati oggi (per chiamata: usage reale se noto, altrimenti la stima)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(accounted_tokens), 0) FROM token_ledger WHERE day = ?", (self._today(),)
+            ).fetchone()
+        return int(row[0])
+
+    def allows(self, tokens: int, low_priority: bool = False) -> bool:
+        """True se `tokens` stanno nel budget di oggi (sempre True senza budget configurato)."""
+        if not self.daily_budget:
+            return True
+        budget = self.daily_budget * (Config.LOW_PRIORITY_BUDGET_SHARE if low_priority else 1.0)
+        return self.used_today() + tokens <= budget
+
+    def check(self, tokens: int, low_priority: bool = False, source: str = ""):
+        """Come allows(), ma solleva QuotaExceededError: il chiamante rinvia l'item."""
+        if not self.allows(tokens, low_priority):
+            METRICS.inc("quota_deferred_total", source=source, priority="low" if low_priority else "high")
+            raise QuotaExceededError(
+                f"Budget token giornaliero esaurito ({self.used_today()}/{self.daily_budget}, richiesti {tokens})"
+            )
+
+    def report(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Consumo per giorno/modello/sorgente con token per insight (per tarare MAX_CHARS_AI)."""
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, model, source, calls, estimated_tokens, actual_tokens, insights, accounted_tokens "
+                "FROM token_ledger WHERE day >= ? ORDER BY day, model, source", (since,)
+            ).fetchall()
+
+        report = []
+        for day, model, source, calls, estimated, actual, insights, tokens in rows:
+            report.append({
+                "day": day, "model": model, "source": source, "calls": calls,
+                "estimated_tokens": estimated, "actual_tokens": actual, "insights": insights,
+                "tokens_per_insight": round(tokens / insights, 1) if insights else None,
+            })
+        return report
+
+    def print_report(self, days: int = 1):
+        rows = self.report(days)
+        if not rows:
+            return
+        budget = f" / budget {self.daily_budget}" if self.daily_budget else ""
+        print(f"\n🔢 TOKEN LEDGER | Oggi: {self.used_today()}{budget}")
+        for r in rows:
+            per_insight = r["tokens_per_insight"] if r["tokens_per_insight"] is not None else "-"
+            print(f"   {r['day']} | {r['model']:<20} | {r['source']:<8} | {r['calls']:>4} call | "
+                  f"stima {r['estimated_tokens']:>8} | reali {r['actual_tokens']:>8} | "
+                  f"{r['insights']:>4} insight | {per_insight} token/insight")
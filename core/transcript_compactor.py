@@ -0,0 +1,91 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+from core.config import Config
+
+# Keyword finanziarie già elencate nel prompt di AIService (stili Tecnica / Fondamentale / Quantitativa)
+FINANCE_KEYWORDS = [
+    "BPR", "FVG", "Order Block", "Sweep", "Liquidity", "Liquidità", "H1", "H4",
+    "EPS", "Fatturato", "Capex", "Macro", "Fed", "Geopolitica",
+    "Stagionalità", "COT", "Forecaster", "Probabilità", "Correlazioni",
+    "Target", "Stop", "Supporto", "Resistenza", "Long", "Short",
+]
+
+# Riempitivi del parlato e tag delle caption automatiche (nessun contenuto informativo)
+FILLER_WORDS = ["ehm", "ehmm", "eh", "uhm", "uh", "um", "umm", "mmm", "mh", "ah"]
+
+# Timestamp tra parentesi o a inizio segmento ("alle 14:30 esce il CPI" resta intatto)
+_TIMESTAMP_RE = re.compile(r"[\[(]\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?[\])]|^\s*\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?\b")
+_CAPTION_TAG_RE = re.compile(r"\[(?:musica|music|applausi|applause|risate|laughter|__)\]", re.IGNORECASE)
+_FILLER_RE = re.compile(r"\b(?:" + "|".join(FILLER_WORDS) + r")\b[,.]?\s*", re.IGNORECASE)
+_KEYWORD_RE = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in FINANCE_KEYWORDS) + r")\b", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+
+# Sovrapposizione (in parole) tra la coda di una caption e l'inizio della successiva: sotto il minimo
+# la coincidenza è casuale ("e", "di", "che" a cavallo di due frasi) e il testo resta intatto
+MIN_OVERLAP_WORDS = 3
+MAX_OVERLAP_WORDS = 20
+
+def _clean_segment(text: str) -> str:
+    text = _TIMESTAMP_RE.sub(" ", text)
+    text = _CAPTION_TAG_RE.sub(" ", text)
+    text = _FILLER_RE.sub("", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+def _dedupe_segments(segments: Iterable[str]) -> List[str]:
+    """Scarta i segmenti consecutivi ripetuti e la parte sovrapposta delle caption a scorrimento."""
+    out: List[str] = []
+    prev_words: List[str] = []
+    for seg in segments:
+        words = seg.split()
+        if not words or words == prev_words:
+            continue
+        # "a b c" seguito da "b c d": si tiene solo "d"
+        overlap = 0
+        for k in range(min(len(prev_words), len(words), MAX_OVERLAP_WORDS), MIN_OVERLAP_WORDS - 1, -1):
+            if [w.lower() for w in prev_words[-k:]] == [w.lower() for w in words[:k]]:
+                overlap = k
+                break
+        if words[overlap:]:
+            out.append(" ".join(words[overlap:]))
+        prev_words = words
+    return out
+
+def keyword_windows(text: str, window_words: int) -> str:
+    """
+    Tiene solo finestre di ±window_words parole attorno alle keyword finanziarie (unite se sovrapposte).
+    Senza keyword il testo resta intero: meglio un prompt lungo che un'analisi vuota.
+    """
+    words = text.split()
+    hits = [i for i, w in enumerate(words) if _KEYWORD_RE.search(w)]
+    # Keyword di due parole ("Order Block")
+    hits += [i for i in range(len(words) - 1) if _KEYWORD_RE.fullmatch(f"{words[i]} {words[i + 1]}".strip(",.;:"))]
+    if not hits:
+        return text
+
+    spans: List[List[int]] = []
+    for i in sorted(set(hits)):
+        start, end = max(0, i - window_words), min(len(words), i + window_words + 1)
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return " … ".join(" ".join(words[s:e]) for s, e in spans)
+
+def compact_transcript(segments: Iterable[str], window_words: Optional[int] = None) -> Tuple[str, float]:
+    """
+    Compatta i segmenti grezzi di una trascrizione per il prompt Gemini (la trascrizione salvata resta grezza):
+    timestamp e tag rimossi, riempitivi eliminati, segmenti ripetuti/sovrapposti scartati,
+    spazi collassati; con window_words > 0 (default Config.TRANSCRIPT_KEYWORD_WINDOW) restano
+    solo le finestre attorno alle keyword finanziarie.
+    Restituisce (testo compatto, rapporto di compressione = caratteri originali / compatti).
+    """
+    segments = [str(s) for s in segments if s]
+    original_chars = len(" ".join(segments))
+    window_words = Config.TRANSCRIPT_KEYWORD_WINDOW if window_words is None else window_words
+
+    text = " ".join(_dedupe_segments(_clean_segment(s) for s in segments))
+    if window_words > 0:
+        text = keyword_windows(text, window_words)
+
+    ratio = original_chars / len(text) if text else 0.0
+    return text, ratio
@@ -0,0 +1,169 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from core.config import Config
+from core.metrics import METRICS
+
+try:
+    import zstandard
+except ImportError:  # Dipendenza opzionale: senza zstd si usa zlib (file più grandi, stesso formato di indice)
+    zstandard = None
+
+class TranscriptStore:
+    """
+    Archivio locale delle trascrizioni grezze, indirizzato per contenuto:
+    ogni testo è salvato una sola volta come oggetto compresso (zstd, fallback zlib)
+    in objects/<hash[:2]>/<sha256>.<ext>; l'indice SQLite mappa video_id -> hash.
+    ApifyService lo consulta prima di avviare un run; rianalisi offline ed esperimenti
+    sui prompt leggono da qui senza toccare Apify. Eviction LRU per dimensione su disco.
+    """
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or os.path.join(Config.LOCAL_STATE_DIR, "transcripts")
+        self.max_bytes = max_bytes if max_bytes is not None else Config.TRANSCRIPT_STORE_MAX_MB * 1024 * 1024
+        self.codec = "zstd" if zstandard else "zlib"
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                video_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                stored_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_hash ON transcripts(content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_access ON transcripts(last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _object_path(self, content_hash: str, codec: str) -> str:
+        ext = "zst" if codec == "zstd" else "zz"
+        return os.path.join(self.root, "objects", content_hash[:2], f"{content_hash}.{ext}")
+
+    def _compress(self, data: bytes) -> bytes:
+        if zstandard:
+            return zstandard.ZstdCompressor(level=Config.TRANSCRIPT_STORE_LEVEL).compress(data)
+        return zlib.compress(data, min(9, Config.TRANSCRIPT_STORE_LEVEL))
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if not zstandard:
+                raise RuntimeError("oggetto zstd ma modulo 'zstandard' non installato")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def get(self, video_id: str) -> Optional[str]:
+        """Trascrizione grezza del video, o None se non archiviata (o oggetto illeggibile)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, codec FROM transcripts WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE transcripts SET last_access = ? WHERE video_id = ?", (time.time(), video_id))
+                self._conn.commit()
+
+        text = None
+        if row:
+            try:
+                with open(self._object_path(row[0], row[1]), "rb") as f:
+                    text = self._decompress(f.read(), row[1]).decode("utf-8")
+            except (OSError, RuntimeError, zlib.error) as e:
+                print(f"      ⚠️ Transcript store: oggetto {row[0][:12]} illeggibile ({e})")
+
+        METRICS.inc("transcript_store_total", result="hit" if text is not None else "miss")
+        with self._lock:
+            if text is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return text
+
+    def put(self, video_id: str, text: str):
+        """Archivia la trascrizione (lo stesso contenuto è scritto una sola volta)."""
+        if not video_id or not text:
+            return
+        data = text.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._object_path(content_hash, self.codec)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(self._compress(data))
+            os.replace(tmp, path)
+        stored = os.path.getsize(path)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (video_id, content_hash, codec, raw_bytes, stored_bytes, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, content_hash, self.codec, len(data), stored, now, now)
+            )
+            self._conn.commit()
+            self._evict()
+            self._publish()
+
+    def _objects(self) -> Dict[str, tuple]:
+        """hash -> (codec, byte su disco, ultimo accesso) degli oggetti referenziati (chiamare sotto lock)."""
+        return {h: (c, s, a) for h, c, s, a in self._conn.execute(
+            "SELECT content_hash, codec, MAX(stored_bytes), MAX(last_access) FROM transcripts GROUP BY content_hash"
+        )}
+
+    def _evict(self):
+        """Rimuove gli oggetti usati meno di recente finché l'archivio rientra in max_bytes (sotto lock)."""
+        if not self.max_bytes:
+            return
+        objects = self._objects()
+        total = sum(size for _, size, _ in objects.values())
+        evicted = 0
+        for content_hash, (codec, size, _) in sorted(objects.items(), key=lambda kv: kv[1][2]):
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM transcripts WHERE content_hash = ?", (content_hash,))
+            try:
+                os.remove(self._object_path(content_hash, codec))
+            except OSError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self._conn.commit()
+            METRICS.inc("transcript_store_evictions_total", evicted)
+
+    def _publish(self):
+        objects = self._objects()
+        METRICS.set_gauge("transcript_store_bytes", sum(size for _, size, _ in objects.values()))
+        METRICS.set_gauge("transcript_store_objects", len(objects))
+
+    def video_ids(self) -> List[str]:
+        """Video archiviati (per rianalisi offline ed esperimenti sui prompt)."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT video_id FROM transcripts ORDER BY created_at")]
+
+    def stats(self) -> Dict[str, float]:
+        """Video, oggetti, byte originali e compressi, hit rate delle letture di questo processo."""
+        with self._lock:
+            videos, raw = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0) FROM transcripts"
+            ).fetchone()
+            objects = self._objects()
+        stored = sum(size for _, size, _ in objects.values())
+        return {
+            "videos": videos,
+            "objects": len(objects),
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_ratio": round(raw / stored, 2) if stored else 0.0,
+            "hit_rate": round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0.0,
+        }
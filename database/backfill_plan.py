@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from core.config import Config
+
+class BackfillPlan:
+    """
+    Piano di un BACKFILL YouTube (SQLite): i video del range, divisi in shard per data.
+    Più processi worker sullo stesso host prendono gli shard con un claim atomico;
+    il worker rinnova il lease (renew) finché lavora lo shard, e uno shard non rinnovato
+    oltre Config.BACKFILL_SHARD_LEASE_SECONDS (worker caduto) torna disponibile.
+    Quando l'ultimo shard è chiuso il piano viene rimosso.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.LOCAL_STATE_DIR, "backfill_plan.sqlite")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # (plan_id, shard) -> token del claim di questo processo, per rinnovare solo i propri lease
+        self._claims: Dict[Tuple[str, str], str] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_shards (
+                plan_id TEXT NOT NULL,
+                shard TEXT NOT NULL,
+                videos TEXT NOT NULL,
+                status TEXT NOT NULL,
+                claim TEXT,
+                claimed_at REAL,
+                PRIMARY KEY (plan_id, shard)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def plan_id(handles: Iterable[str], start: datetime, end: datetime, shard_days: int) -> str:
+        """Stesso range, canali e ampiezza shard -> stesso piano (ripreso da tutti i worker)."""
+        key = f"{','.join(sorted(handles))}|{start.isoformat()}|{end.isoformat()}|{shard_days}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+    def exists(self, plan_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM backfill_shards WHERE plan_id = ? LIMIT 1", (plan_id,)).fetchone()
+        return row is not None
+
+    def add_shards(self, plan_id: str, shards: Dict[str, List[Dict[str, Any]]]):
+        """Registra gli shard (ignorati se un altro worker li ha già pianificati)."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO backfill_shards (plan_id, shard, videos, status) VALUES (?, ?, ?, ?)",
+                [(plan_id, shard, json.dumps(videos, ensure_ascii=False), self.PENDING) for shard, videos in shards.items()]
+            )
+            self._conn.commit()
+
+    def claim(self, plan_id: str, lease_seconds: Optional[float] = None) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """(shard, video) del prossimo shard libero, riservato a questo worker; None se finiti."""
+        lease = Config.BACKFILL_SHARD_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        now = time.time()
+        token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        with self._lock:
+            # Un solo UPDATE: due processi non possono prendere lo stesso shard
+            self._conn.execute(
+                "UPDATE backfill_shards SET status = ?, claim = ?, claimed_at = ? WHERE rowid = ("
+                "  SELECT rowid FROM backfill_shards WHERE plan_id = ? "
+                "  AND (status = ? OR (status = ? AND claimed_at < ?)) ORDER BY shard LIMIT 1)",
+                (self.RUNNING, token, now, plan_id, self.PENDING, self.RUNNING, now - lease)
+            )
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT shard, videos FROM backfill_shards WHERE plan_id = ? AND claim = ?", (plan_id, token)
+            ).fetchone()
+            if row:
+                self._claims[(plan_id, row[0])] = token
+        return (row[0], json.loads(row[1])) if row else None
+
+    def renew(self, plan_id: str, shard: str) -> bool:
+        """Rinnova il lease di uno shard di questo processo; False se è scaduto e un altro worker l'ha preso."""
+        with self._lock:
+            token = self._claims.get((plan_id, shard))
+            if not token:
+                return False
+            cur = self._conn.execute(
+                "UPDATE backfill_shards SET claimed_at = ? WHERE plan_id = ? AND shard = ? AND status = ? AND claim = ?",
+                (time.time(), plan_id, shard, self.RUNNING, token)
+            )
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def complete(self, plan_id: str, shard: str) -> bool:
+        """Chiude uno shard di questo processo; False se il lease era scaduto e un altro worker l'ha preso."""
+        with self._lock:
+            token = self._claims.pop((plan_id, shard), None)
+            if not token:
+                return False
+            cur = self._conn.execute(
+                "UPDATE backfill_shards SET status = ? WHERE plan_id = ? AND shard = ? AND claim = ?",
+                (self.DONE, plan_id, shard, token)
+            )
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def release(self, plan_id: str, shard: str):
+        """Rimette lo shard in coda (es. budget token esaurito a metà shard)."""
+        with self._lock:
+            token = self._claims.pop((plan_id, shard), None)
+            if not token:
+                return
+            self._conn.execute(
+                "UPDATE backfill_shards SET status = ?, claim = NULL, claimed_at = NULL "
+                "WHERE plan_id = ? AND shard = ? AND claim = ?",
+                (self.PENDING, plan_id, shard, token)
+            )
+            self._conn.commit()
+
+    def progress(self, plan_id: str) -> Dict[str, Dict[str, int]]:
+        """Per canale: video totali e video negli shard chiusi."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT videos, status FROM backfill_shards WHERE plan_id = ?", (plan_id,)
+            ).fetchall()
+        report: Dict[str, Dict[str, int]] = {}
+        for videos, status in rows:
+            for v in json.loads(videos):
+                counts = report.setdefault(v.get("handle", "?"), {"total": 0, "done": 0})
+                counts["total"] += 1
+                if status == self.DONE:
+                    counts["done"] += 1
+        return report
+
+    def finished(self, plan_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM backfill_shards WHERE plan_id = ? AND status != ?", (plan_id, self.DONE)
+            ).fetchone()
+        return row[0] == 0
+
+    def open_shards(self, plan_id: str) -> int:
+        """Shard del piano non ancora chiusi (in coda o in lavorazione da qualche worker)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM backfill_shards WHERE plan_id = ? AND status != ?", (plan_id, self.DONE)
+            ).fetchone()
+        return row[0]
+
+    def clear(self, plan_id: Optional[str] = None):
+        with self._lock:
+            if plan_id:
+                self._conn.execute("DELETE FROM backfill_shards WHERE plan_id = ?", (plan_id,))
+            else:
+                self._conn.execute("DELETE FROM backfill_shards")
+            self._conn.commit()
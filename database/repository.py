@@ -1,16 +1,152 @@
-from typing import List, Dict, Any, cast
+from typing import List, Dict, Any, Optional, Iterable, Tuple, cast
 import json
+import threading
 from .connection import get_db_client
+from core.metrics import METRICS
+from core.tickers import normalize_ticker
 
 class MarketRepository:
+    # Dimensione pagina per le letture massive e per i filtri IN (limite URL/querystring)
+    PAGE_SIZE = 1000
+    IN_CHUNK_SIZE = 100
+
     def __init__(self):
         self.client = get_db_client()
+        # Indice in memoria degli URL già presenti in intelligence_feed
+        self._known_urls: set = set()
+        # Ticker presenti in 'assets': caricati una volta, aggiornati dagli upsert di questo processo
+        self._known_assets: Optional[set] = None
+        self._assets_lock = threading.Lock()
+        self._asset_stats = {"hits": 0, "misses": 0, "upserts": 0, "round_trips_saved": 0}
 
     def video_exists(self, url: str) -> bool:
         """Controlla se un URL (Video o Post) esiste già nel feed."""
+        if url in self._known_urls:
+            return True
         res = self.client.table("intelligence_feed").select("id").eq("url", url).execute()
         return len(res.data) > 0
 
+    def prefetch_known_urls(self, feed_type: Optional[str] = None, since: Optional[str] = None) -> int:
+        """
+        Carica in memoria (paginando) gli URL già salvati per un tipo di feed
+        ('VIDEO', 'SOCIAL_POST') e, opzionalmente, da una data ISO in poi.
+        Restituisce il numero di URL caricati.
+        """
+        loaded = 0
+        offset = 0
+        try:
+            while True:
+                query = self.client.table("intelligence_feed").select("url")
+                if feed_type:
+                    query = query.eq("feed_type", feed_type)
+                if since:
+                    query = query.gte("published_at", since)
+                with METRICS.time_stage("db_read", table="intelligence_feed"):
+                    res = query.order("id").range(offset, offset + self.PAGE_SIZE - 1).execute()
+
+                rows = res.data or []
+                for row in rows:
+                    url = cast(Dict[str, Any], row).get("url")
+                    if url:
+                        self._known_urls.add(url)
+                loaded += len(rows)
+
+                if len(rows) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
+        except Exception as e:
+            print(f"      ⚠️ Prefetch URL fallito ({feed_type}): {e}")
+
+        print(f"   🗂️  Indice URL: {loaded} caricati ({feed_type or 'ALL'}) | Totale in memoria: {len(self._known_urls)}")
+        return loaded
+
+    def get_trump_score_history(self) -> List[Tuple[str, int]]:
+        """
+        Storico (contenuto, impact_score) dei post Truth salvati, per addestrare il pre-classificatore.
+        Lo score è quello assegnato da Gemini e conservato in raw_metadata.
+        """
+        history: List[Tuple[str, int]] = []
+        offset = 0
+        try:
+            while True:
+                query = self.client.table("intelligence_feed").select("content, raw_metadata").eq("feed_type", "SOCIAL_POST")
+                with METRICS.time_stage("db_read", table="intelligence_feed"):
+                    res = query.order("id").range(offset, offset + self.PAGE_SIZE - 1).execute()
+
+                rows = res.data or []
+                for row in rows:
+                    row = cast(Dict[str, Any], row)
+                    meta = row.get("raw_metadata") or {}
+                    if isinstance(meta, str):
+                        meta = json.loads(meta)
+                    score = meta.get("impact_score") if isinstance(meta, dict) else None
+                    if row.get("content") and isinstance(score, (int, float)):
+                        history.append((row["content"], int(score)))
+
+                if len(rows) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
+        except Exception as e:
+            print(f"      ⚠️ Lettura storico Truth fallita: {e}")
+        return history
+
+    def filter_new_urls(self, urls: Iterable[str]) -> List[str]:
+        """
+        Restituisce solo gli URL non ancora presenti nel feed, mantenendo l'ordine.
+        Usa l'indice in memoria; gli URL sconosciuti (es. fuori dalla finestra del prefetch)
+        vengono verificati con poche query IN a blocchi invece di una query per URL.
+        """
+        candidates = [u for u in dict.fromkeys(urls) if u and u not in self._known_urls]
+
+        for i in range(0, len(candidates), self.IN_CHUNK_SIZE):
+            chunk = candidates[i:i + self.IN_CHUNK_SIZE]
+            try:
+                with METRICS.time_stage("db_read", table="intelligence_feed"):
+                    res = self.client.table("intelligence_feed").select("url").in_("url", chunk).execute()
+                for row in (res.data or []):
+                    self._known_urls.add(cast(Dict[str, Any], row).get("url"))
+            except Exception as e:
+                print(f"      ⚠️ Verifica URL fallita: {e}")
+
+        return [u for u in candidates if u not in self._known_urls]
+
+    def mark_known(self, url: str):
+        """Segna un URL come già elaborato (es. post analizzato ma non salvato per score basso)."""
+        if url:
+            self._known_urls.add(url)
+
+    def link_duplicate(self, url: str, original_url: str) -> bool:
+        """
+        Collega un near-duplicate (repost, ri-caricamento) al suo originale senza una nuova riga nel feed:
+        l'URL è aggiunto a raw_metadata.duplicates della riga originale.
+        Restituisce False solo per errori DB (da ritentare); se l'originale non è nel feed
+        (es. post Truth a basso impatto non salvato) non c'è nulla da collegare.
+        """
+        try:
+            with METRICS.time_stage("db_read", table="intelligence_feed"):
+                res = self.client.table("intelligence_feed").select("id, raw_metadata").eq("url", original_url).execute()
+            if not res.data:
+                print(f"      ℹ️ Originale non nel feed, nessun collegamento: {original_url}")
+                self._known_urls.add(url)
+                return True
+
+            row = cast(Dict[str, Any], res.data[0])
+            meta = row.get("raw_metadata") or {}
+            if isinstance(meta, str):
+                meta = json.loads(meta)
+            if not isinstance(meta, dict):
+                meta = {"value": meta}
+            duplicates = list(meta.get("duplicates") or [])
+            if url not in duplicates:
+                meta["duplicates"] = duplicates + [url]
+                with METRICS.time_stage("db_write", table="intelligence_feed"):
+                    self.client.table("intelligence_feed").update({"raw_metadata": meta}).eq("id", row["id"]).execute()
+            self._known_urls.add(url)
+            return True
+        except Exception as e:
+            print(f"      ⚠️ Collegamento near-duplicate fallito ({url}): {e}")
+            return False
+
     def get_source_id(self, name: str, base_url: str = "") -> int:
         """Recupera o crea una Fonte (Canale YT o Social)."""
         res = self.client.table("sources").select("id").eq("name", name).execute()
@@ -20,39 +156,103 @@ class MarketRepository:
         # Se non esiste, la crea (Default category sarà 'VIDEO_ANALYSIS' dal DB)
         payload = {"name": name}
         if base_url: payload["base_url"] = base_url
-        new = self.client.table("sources").insert(payload).execute()
+        with METRICS.time_stage("db_write", table="sources"):
+            new = self.client.table("sources").insert(payload).execute()
         
         if new.data:
             return int(cast(Dict[str, Any], new.data[0]).get('id', 0))
         raise Exception(f"Failed to get source ID for: {name}")
 
-    def _ensure_asset_exists(self, ticker: str):
+    def _load_known_assets(self):
+        """Carica (una volta, paginando) i ticker già presenti in 'assets' (chiamare sotto _assets_lock)."""
+        if self._known_assets is not None:
+            return
+        self._known_assets = set()
+        offset = 0
+        try:
+            while True:
+                with METRICS.time_stage("db_read", table="assets"):
+                    res = self.client.table("assets").select("ticker").order("ticker").range(offset, offset + self.PAGE_SIZE - 1).execute()
+                rows = res.data or []
+                for row in rows:
+                    ticker = cast(Dict[str, Any], row).get("ticker")
+                    if ticker:
+                        self._known_assets.add(str(ticker).strip().upper())
+                if len(rows) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
+        except Exception as e:
+            # Senza indice si ricade sugli upsert (idempotenti): nessun errore di Foreign Key
+            print(f"      ⚠️ Lettura assets fallita: {e}")
+        print(f"   🗂️  Indice asset: {len(self._known_assets)} ticker in memoria")
+
+    def ensure_assets(self, tickers: Iterable[str]):
         """
         Metodo Helper (Auto-Healing):
-        Verifica se un ticker esiste nella tabella 'assets'.
-        Se non esiste, lo crea al volo come 'MACRO' o 'CRYPTO' generico per evitare errori di Foreign Key.
+        Garantisce che i ticker esistano nella tabella 'assets'. I ticker noti (cache caricata una volta)
+        non costano nulla; quelli sconosciuti dell'intero blocco sono creati con UN solo upsert,
+        come 'MACRO' o 'CRYPTO' generico, per evitare errori di Foreign Key.
         """
-        ticker = ticker.strip().upper()
+        with self._assets_lock:
+            self._load_known_assets()
+            requested = [t.strip().upper() for t in tickers if t and t.strip()]
+            missing = {t for t in requested if t not in self._known_assets}
+            hits = sum(1 for t in requested if t not in missing)
+            self._asset_stats["hits"] += hits
+            self._asset_stats["misses"] += len(requested) - hits
+        if hits:
+            METRICS.inc("asset_cache_total", hits, result="hit")
+        if len(requested) - hits:
+            METRICS.inc("asset_cache_total", len(requested) - hits, result="miss")
+        if not missing:
+            self._record_saved_round_trips(len(requested))
+            return
+
         # Mappa rudimentale per indovinare il tipo se non lo conosciamo
-        guessed_type = "CRYPTO" if "USD" in ticker and len(ticker) > 6 else "MACRO"
-        
+        payload = [{
+            "ticker": ticker,
+            "name": f"{ticker} (Auto-Detected)",
+            "type": "CRYPTO" if "USD" in ticker and len(ticker) > 6 else "MACRO"
+        } for ticker in sorted(missing)]
         try:
-            # Tenta un upsert 'soft': se c'è già non fa nulla (grazie a ON CONFLICT nel DB), se manca lo crea.
-            payload = {
-                "ticker": ticker,
-                "name": f"{ticker} (Auto-Detected)",
-                "type": guessed_type 
-            }
-            # Nota: Supabase-py upsert richiede on_conflict se vogliamo ignorare duplicati senza errori
-            self.client.table('assets').upsert(payload, on_conflict='ticker').execute()
+            # Upsert 'soft' in blocco: i ticker già presenti non cambiano (ON CONFLICT), i mancanti vengono creati
+            with METRICS.time_stage("db_write", table="assets"):
+                self.client.table('assets').upsert(payload, on_conflict='ticker').execute()
+            with self._assets_lock:
+                self._known_assets.update(missing)
+                self._asset_stats["upserts"] += 1
+            # Prima: un upsert per ticker richiesto; ora uno solo per il blocco
+            self._record_saved_round_trips(len(requested) - 1)
         except Exception as e:
             # Log leggero, non blocchiamo il flusso per questo
-            print(f"      ⚠️ Warning asset '{ticker}': {e}")
+            print(f"      ⚠️ Warning asset {sorted(missing)}: {e}")
+
+    def _record_saved_round_trips(self, saved: int):
+        if saved > 0:
+            with self._assets_lock:
+                self._asset_stats["round_trips_saved"] += saved
+            METRICS.inc("asset_round_trips_saved_total", saved)
 
-    def save_trump_signal(self, signal_data: Dict[str, Any]):
+    def asset_cache_stats(self) -> Dict[str, float]:
+        """Ticker serviti dalla cache, mancanti, upsert eseguiti e round trip risparmiati."""
+        with self._assets_lock:
+            stats = dict(self._asset_stats)
+            stats["known"] = len(self._known_assets or ())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def print_asset_report(self):
+        stats = self.asset_cache_stats()
+        if stats["hits"] + stats["misses"]:
+            print(f"🏷️ Asset: hit rate {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}) | "
+                  f"{stats['upserts']} upsert in blocco | {stats['round_trips_saved']} round trip risparmiati")
+
+    def save_trump_signal(self, signal_data: Dict[str, Any]) -> bool:
         """
         Salva un segnale da Truth Social (Trump Watch).
         Gestisce le nuove colonne 'impact_score' e 'feed_type'.
+        Restituisce True se il feed è stato salvato.
         """
         ai_data = signal_data.get('ai_analysis', {})
         summary = ai_data.get('summary_it', 'N/A')
@@ -81,13 +281,15 @@ class MarketRepository:
             }
 
             # Upsert su URL
-            res_feed = self.client.table("intelligence_feed").upsert(feed_payload, on_conflict='url').execute()
+            with METRICS.time_stage("db_write", table="intelligence_feed"):
+                res_feed = self.client.table("intelligence_feed").upsert(feed_payload, on_conflict='url').execute()
             
             if not res_feed.data:
                 print("      ❌ Errore DB: Impossibile salvare il Feed Trump.")
-                return
+                return False
 
             feed_id = int(cast(Dict[str, Any], res_feed.data[0]).get('id', 0))
+            self._known_urls.add(signal_data['url'])
 
             # 3. Salva gli Insights (Impatto su Asset)
             assets_list = ai_data.get('assets_affected', [])
@@ -96,14 +298,13 @@ class MarketRepository:
             if not assets_list and ai_data.get('impact_score', 0) >= 4:
                 assets_list = ['USD']
 
-            saved_count = 0
-            for ticker in assets_list:
-                clean_ticker = str(ticker).strip().upper()
-                
-                # AUTO-HEALING: Crea l'asset se non esiste
-                self._ensure_asset_exists(clean_ticker)
+            tickers = [str(ticker).strip().upper() for ticker in assets_list]
+            # AUTO-HEALING: Crea in blocco gli asset che non esistono
+            self.ensure_assets(tickers)
 
-                insight_payload = {
+            rows_to_insert = []
+            for clean_ticker in tickers:
+                rows_to_insert.append({
                     "video_id": feed_id,
                     "asset_ticker": clean_ticker,
                     "asset_name": f"{clean_ticker} (Trump Target)",
@@ -114,33 +315,64 @@ class MarketRepository:
                     "impact_score": ai_data.get('impact_score', 3), # NUOVO CAMPO
                     "summary_card": f"🚨 TRUMP: {summary}",
                     "confidence_score": 5
-                }
+                })
 
-                self.client.table('market_insights').insert(insight_payload).execute()
-                saved_count += 1
+            if rows_to_insert:
+                with METRICS.time_stage("db_write", table="market_insights"):
+                    self.client.table('market_insights').insert(rows_to_insert).execute()
 
-            print(f"      ✅ Successo! Feed ID: {feed_id} | Insights creati: {saved_count}")
+            print(f"      ✅ Successo! Feed ID: {feed_id} | Insights creati: {len(rows_to_insert)}")
+            return True
 
         except Exception as e:
             print(f"      ⚠️ CRITICAL DB ERROR (Trump): {e}")
+            return False
 
-    def save_analysis_transaction(self, video_data: Dict[str, Any], analysis: Dict[str, Any]):
+    def prepare_insight(self, item: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Salva video YouTube e insights.
-        Aggiornato per usare _ensure_asset_exists e feed_type.
-        """
-        # Mappa di normalizzazione storica
-        TICKER_FIX = {
-            "NQ": "NQ100", "NAS100": "NQ100", "NASDAQ": "NQ100", "NAS": "NQ100",
-            "ES": "SPX500", "US500": "SPX500", "S&P500": "SPX500", "SPX": "SPX500",
-            "DOW": "DJ30", "US30": "DJ30", "YM": "DJ30",
-            "EU": "EURUSD", "GU": "GBPUSD", "UJ": "USDJPY", "UC": "USDCHF",
-            "GOLD": "XAUUSD", "ORO": "XAUUSD", "SILVER": "XAGUSD", "ARGENTO": "XAGUSD",
-            "OIL": "WTI", "PETROLIO": "WTI", "BRENT": "BRENT",
-            "BTC": "BTCUSD", "ETH": "ETHUSD", "SOL": "SOLUSD",
-            "US10Y": "US10Y", "DXY": "DXY", "DOLLARO": "DXY"
+        Normalizza un asset dell'analisi AI nella riga 'market_insights' (senza video_id).
+        Senza I/O: è anche la destinazione di on_asset durante lo streaming Gemini; i ticker mancanti
+        in 'assets' sono creati con un solo upsert per analisi al salvataggio (ensure_assets).
+        """
+        # A. Normalizzazione Ticker
+        clean_ticker = normalize_ticker(item.get("asset_ticker", "UNKNOWN"))
+
+        # B. Normalizzazione Recommendation
+        raw_rec = str(item.get("recommendation", "WATCH")).upper().strip()
+        if "LONG" in raw_rec or "BUY" in raw_rec: clean_rec = "LONG"
+        elif "SHORT" in raw_rec or "SELL" in raw_rec: clean_rec = "SHORT"
+        elif "HOLD" in raw_rec: clean_rec = "HOLD"
+        else: clean_rec = "WATCH"
+        
+        # C. Normalizzazione Sentiment
+        raw_sent = str(item.get("sentiment", "Neutral/Range")).strip()
+        if "Bull" in raw_sent: clean_sent = "Bullish"
+        elif "Bear" in raw_sent: clean_sent = "Bearish"
+        else: clean_sent = "Neutral/Range"
+
+        # D. Preparazione riga
+        return {
+            "asset_ticker": clean_ticker[:10],
+            "asset_name": item.get("asset_name", ""),
+            "channel_style": item.get("channel_style", "Fondamentale"),
+            "sentiment": clean_sent,
+            "recommendation": clean_rec,
+            "time_horizon": item.get("time_horizon", "Medium Term"),
+            "entry_zone": item.get("entry_zone"),
+            "target_price": item.get("target_price"),
+            "stop_invalidation": item.get("stop_invalidation"),
+            "key_drivers": item.get("key_drivers", []),
+            "summary_card": (item.get("summary_card") or "")[:500],
+            "impact_score": 0 # Default per i video normal
         }
 
+    def save_analysis_transaction(self, video_data: Dict[str, Any], analysis: Dict[str, Any]) -> bool:
+        """
+        Salva video YouTube e insights.
+        Aggiornato per usare ensure_assets (in blocco) e feed_type.
+        Restituisce True se il feed è stato salvato.
+        """
+
         try:
             # 1. Gestione Sorgente
             channel_name = video_data.get('ch_title', 'Unknown Channel')
@@ -160,64 +392,34 @@ class MarketRepository:
                 "raw_metadata": {"vid": video_data['id']}
             }
             
-            res_feed = self.client.table("intelligence_feed").insert(feed_payload).execute()
+            with METRICS.time_stage("db_write", table="intelligence_feed"):
+                res_feed = self.client.table("intelligence_feed").insert(feed_payload).execute()
             if not res_feed.data:
                 raise Exception("Errore durante l'inserimento del feed.")
             
             video_db_id = int(cast(Dict[str, Any], res_feed.data[0]).get('id', 0))
+            self._known_urls.add(video_data['url'])
             print(f"      💾 DB: Feed salvato (ID: {video_db_id})")
 
             # 3. Salvataggio Insights
             assets_list = analysis.get("assets", [])
             if not assets_list:
                 print("      ⚠️ Nessun asset trovato dall'AI in questo video.")
-                return
+                return True
 
-            rows_to_insert = []
-            for item in assets_list:
-                # A. Normalizzazione Ticker
-                raw_ticker = str(item.get("asset_ticker", "UNKNOWN")).upper().strip()
-                clean_ticker = TICKER_FIX.get(raw_ticker, raw_ticker)
-
-                # AUTO-HEALING: Crea asset se manca (Fix Foreign Key Error)
-                self._ensure_asset_exists(clean_ticker)
-
-                # B. Normalizzazione Recommendation
-                raw_rec = str(item.get("recommendation", "WATCH")).upper().strip()
-                if "LONG" in raw_rec or "BUY" in raw_rec: clean_rec = "LONG"
-                elif "SHORT" in raw_rec or "SELL" in raw_rec: clean_rec = "SHORT"
-                elif "HOLD" in raw_rec: clean_rec = "HOLD"
-                else: clean_rec = "WATCH"
-                
-                # C. Normalizzazione Sentiment
-                raw_sent = str(item.get("sentiment", "Neutral/Range")).strip()
-                if "Bull" in raw_sent: clean_sent = "Bullish"
-                elif "Bear" in raw_sent: clean_sent = "Bearish"
-                else: clean_sent = "Neutral/Range"
-
-                # D. Preparazione riga
-                rows_to_insert.append({
-                    "video_id": video_db_id,
-                    "asset_ticker": clean_ticker[:10],
-                    "asset_name": item.get("asset_name", ""),
-                    "channel_style": item.get("channel_style", "Fondamentale"),
-                    "sentiment": clean_sent,
-                    "recommendation": clean_rec,
-                    "time_horizon": item.get("time_horizon", "Medium Term"),
-                    "entry_zone": item.get("entry_zone"),
-                    "target_price": item.get("target_price"),
-                    "stop_invalidation": item.get("stop_invalidation"),
-                    "key_drivers": item.get("key_drivers", []),
-                    "summary_card": item.get("summary_card", "")[:500],
-                    "impact_score": 0 # Default per i video normal
-                })
+            rows_to_insert = [dict(self.prepare_insight(item), video_id=video_db_id) for item in assets_list]
+            # AUTO-HEALING: un solo upsert per tutti i ticker mancanti (Fix Foreign Key Error)
+            self.ensure_assets([row["asset_ticker"] for row in rows_to_insert])
 
             if rows_to_insert:
-                self.client.table("market_insights").insert(rows_to_insert).execute()
+                with METRICS.time_stage("db_write", table="market_insights"):
+                    self.client.table("market_insights").insert(rows_to_insert).execute()
                 print(f"      💾 DB: Salvati {len(rows_to_insert)} insights operativi.")
+            return True
                 
         except Exception as e:
             print(f"      ❌ DB Error Transaction: {e}")
+            return False
 
     def get_all_insights_flat(self) -> List[Dict[str, Any]]:
         """
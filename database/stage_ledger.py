@@ -0,0 +1,98 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from core.config import Config
+
+class StageLedger:
+    """
+    Registro locale (SQLite) degli stadi completati per ogni item della pipeline.
+    Permette a un BACKFILL interrotto di ripartire dall'ultimo checkpoint:
+    listing canali/post, trascrizioni e analisi AI già pagate vengono riutilizzate.
+    """
+    FETCHED = "fetched"
+    TRANSCRIBED = "transcribed"
+    ANALYZED = "analyzed"
+    PERSISTED = "persisted"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.LOCAL_STATE_DIR, "stage_ledger.sqlite")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # Condiviso da più processi (BACKFILL + BACKFILL_WORKER): attende il lock invece di fallire
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stage_ledger (
+                run_key TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                payload TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (run_key, item_key, stage)
+            )
+        """)
+        # High-watermark per sorgente (es. ultimo post Truth elaborato): sopravvive a clear()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                name TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def mark(self, run_key: str, item_key: str, stage: str, payload: Any = None):
+        """Registra il completamento di uno stadio (con eventuale output da riutilizzare)."""
+        data = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stage_ledger (run_key, item_key, stage, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (run_key, item_key, stage, data, now)
+            )
+            self._conn.commit()
+
+    def get(self, run_key: str, item_key: str, stage: str) -> Optional[Any]:
+        """Restituisce il payload dello stadio se completato, altrimenti None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM stage_ledger WHERE run_key = ? AND item_key = ? AND stage = ?",
+                (run_key, item_key, stage)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]) if row[0] is not None else True
+
+    def is_done(self, run_key: str, item_key: str, stage: str) -> bool:
+        return self.get(run_key, item_key, stage) is not None
+
+    def summary(self, run_key: str) -> Dict[str, int]:
+        """Conteggio item per stadio (per log di ripresa)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, COUNT(*) FROM stage_ledger WHERE run_key = ? GROUP BY stage", (run_key,)
+            ).fetchall()
+        return {stage: count for stage, count in rows}
+
+    def get_watermark(self, name: str) -> Optional[Dict[str, Any]]:
+        """Ultimo item elaborato della sorgente (es. {"id", "created_at"}), o None al primo run."""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_watermark(self, name: str, payload: Dict[str, Any]):
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (name, payload, updated_at) VALUES (?, ?, ?)",
+                (name, json.dumps(payload, ensure_ascii=False), now)
+            )
+            self._conn.commit()
+
+    def clear(self, run_key: str):
+        """Chiude un run completato: il prossimo ripartirà da zero."""
+        with self._lock:
+            self._conn.execute("DELETE FROM stage_ledger WHERE run_key = ?", (run_key,))
+            self._conn.commit()
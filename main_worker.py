@@ -1,6 +1,18 @@
 import os
-from backend.orchestrator import run_pipeline
+from backend.orchestrator import run_pipeline, run_daemon, run_train_classifier, run_bench_html, run_backfill_worker
 
 if __name__ == "__main__":
     mode = os.getenv("WORKER_MODE", "LIVE").upper()
-    run_pipeline(mode)
\ No newline at end of file
+    if mode == "DAEMON":
+        run_daemon()
+    elif mode == "TRAIN_CLASSIFIER":
+        run_train_classifier()
+    elif mode == "BACKFILL_WORKER":
+        run_backfill_worker()
+    elif mode == "BENCH_HTML":
+        run_bench_html()
+    elif mode == "REPLAY":
+        from backend.replay import run_replay
+        run_replay()
+    else:
+        run_pipeline(mode)
\ No newline at end of file
@@ -0,0 +1,28 @@
+from database.backfill_plan import BackfillPlan
+
+
+def test_open_shards_counts_only_the_given_plan(tmp_path):
+    plan = BackfillPlan(str(tmp_path / "plan.sqlite"))
+    plan.add_shards("current", {"2024-01-01": [{"url": "a"}]})
+    plan.add_shards("abandoned", {"2023-01-01": [{"url": "b"}], "2023-01-08": [{"url": "c"}]})
+
+    assert plan.open_shards("current") == 1
+    shard, _ = plan.claim("current")
+    plan.complete("current", shard)
+    assert plan.open_shards("current") == 0
+    assert plan.open_shards("abandoned") == 2
+
+
+def test_complete_after_lost_lease_keeps_the_new_claim(tmp_path):
+    path = str(tmp_path / "plan.sqlite")
+    first, second = BackfillPlan(path), BackfillPlan(path)
+    first.add_shards("p", {"2024-01-01": [{"url": "a"}]})
+
+    shard, _ = first.claim("p")
+    # Lease scaduto: il secondo worker riprende lo shard
+    assert second.claim("p", lease_seconds=-1)[0] == shard
+
+    assert first.complete("p", shard) is False
+    assert second.open_shards("p") == 1
+    assert second.complete("p", shard) is True
+    assert second.open_shards("p") == 0
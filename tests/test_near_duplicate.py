@@ -0,0 +1,34 @@
+from backend.orchestrator import VideoStages
+from backend.replay import FaultInjector, ReplayMarketRepository
+from core.near_duplicate import NearDuplicateIndex
+from database.stage_ledger import StageLedger
+
+TEXT = ("il presidente annuncia nuovi dazi del venticinque per cento sulle importazioni di acciaio "
+        "e alluminio dalla cina con effetti attesi sui mercati delle materie prime")
+
+
+class CountingAI:
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_video(self, text, video_title, low_priority=False, on_asset=None):
+        self.calls += 1
+        return {"summary": "dazi", "assets": []}
+
+
+def test_empty_index_finds_duplicate_on_second_item(tmp_path):
+    near_dups = NearDuplicateIndex(str(tmp_path / "near_dup.sqlite"))
+    assert len(near_dups) == 0
+
+    ai = CountingAI()
+    repo = ReplayMarketRepository(FaultInjector({}, 0.0, 0.0, 0))
+    stages = VideoStages("LIVE", repo, None, None, ai, StageLedger(str(tmp_path / "ledger.sqlite")), "LIVE",
+                         near_dups=near_dups)
+
+    first = {"url": "https://youtu.be/a", "title": "Dazi", "content": TEXT}
+    assert stages.analyze(first) is not None
+    assert len(near_dups) == 1
+
+    second = {"url": "https://youtu.be/b", "title": "Dazi (reupload)", "content": TEXT + " oggi"}
+    assert stages.analyze(second) is None
+    assert ai.calls == 1
@@ -0,0 +1,31 @@
+from backend.orchestrator import WorkerContext
+from backend.replay import (FaultInjector, ReplayAIService, ReplayApifyService, ReplayMarketRepository,
+                            ReplayTrumpWatchService, ReplayYouTubeService, build_replay_context, load_fixture)
+from core.config import Config
+from core.near_duplicate import NearDuplicateIndex
+from database.backfill_plan import BackfillPlan
+from database.stage_ledger import StageLedger
+
+
+def test_worker_context_keeps_empty_replay_state(tmp_path):
+    fixture, faults = load_fixture(), FaultInjector({}, 0.0, 0.0, 0)
+    near_dups = NearDuplicateIndex(str(tmp_path / "replay_near_dup.sqlite"))
+    ledger = StageLedger(str(tmp_path / "replay_ledger.sqlite"))
+    plan = BackfillPlan(str(tmp_path / "replay_backfill_plan.sqlite"))
+
+    ctx = WorkerContext(repo=ReplayMarketRepository(faults), yt=ReplayYouTubeService(fixture, faults),
+                        trump_truth=ReplayTrumpWatchService(fixture, faults), apify=ReplayApifyService(fixture, faults),
+                        ai=ReplayAIService(fixture, faults), ledger=ledger, near_dups=near_dups, plan=plan)
+
+    assert ctx.near_dups is near_dups
+    assert ctx.ledger is ledger
+    assert ctx.plan is plan
+
+
+def test_replay_context_does_not_touch_production_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "LOCAL_STATE_DIR", str(tmp_path))
+    ctx = build_replay_context(load_fixture(), FaultInjector({}, 0.0, 0.0, 0))
+
+    assert len(ctx.near_dups) == 0
+    assert ctx.near_dups.path == str(tmp_path / "replay_near_dup.sqlite")
+    assert not (tmp_path / "near_dup_index.sqlite").exists()
@@ -0,0 +1,10 @@
+from datetime import datetime, timezone
+
+from backend.services.trump_service import TrumpWatchService
+
+
+def test_parse_date_falls_back_to_dateutil_for_non_iso_dates():
+    expected = datetime(2026, 2, 5, 14, 3, 22, tzinfo=timezone.utc)
+    assert TrumpWatchService.parse_date("2026-02-05T14:03:22.000Z") == expected
+    assert TrumpWatchService.parse_date("Thu, 05 Feb 2026 14:03:22 GMT") == expected
+    assert TrumpWatchService.parse_date("non una data") is None